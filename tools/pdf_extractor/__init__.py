@@ -4,7 +4,7 @@ Ferramentas para extração de dados do PDF do Tormenta 20.
 
 from .pdf_extractor import PDFExtractor, extract_entities, list_available_sections
 from .prompts import get_prompt, PROMPTS
-from .pipeline import run_pipeline, LLMClient
+from .pipeline import run_pipeline, LLMClient, LLMClientPool, RunSettings
 
 __all__ = [
     "PDFExtractor",
@@ -13,5 +13,7 @@ __all__ = [
     "get_prompt",
     "PROMPTS",
     "run_pipeline",
-    "LLMClient"
+    "LLMClient",
+    "LLMClientPool",
+    "RunSettings"
 ]
@@ -0,0 +1,191 @@
+"""
+Benchmarks do extrator de PDF do Tormenta 20.
+
+Uso:
+    python benchmark.py extraction <pdf_path> [--workers 1 2 4 8 16]
+    python benchmark.py json [--corpus llm_responses.sqlite3]
+
+Exemplo:
+    python benchmark.py extraction tormenta20.pdf --workers 1 4 16
+    python benchmark.py json --corpus ~/.cache/tormenta20/llm_responses.sqlite3
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sqlite3
+import time
+from typing import Callable, Optional
+
+from pdf_extractor import PDFExtractor
+from pipeline import extract_json_from_response
+
+
+def bench_extraction(pdf_path: str, workers_list: list[int], repeat: int = 1) -> list[dict]:
+    """
+    Mede o tempo de extração do livro inteiro para cada número de workers.
+
+    O cache em disco fica desativado para que toda execução passe pelo
+    pdfplumber.
+
+    Returns:
+        Lista com {"workers", "seconds", "speedup"} por configuração
+    """
+    results = []
+    baseline = None
+
+    for workers in workers_list:
+        best = None
+        for _ in range(repeat):
+            extractor = PDFExtractor(pdf_path, workers=workers)
+            start = time.perf_counter()
+            extractor.extract()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        if baseline is None:
+            baseline = best
+        results.append({
+            "workers": workers,
+            "seconds": best,
+            "speedup": baseline / best if best else 0.0,
+        })
+
+    return results
+
+
+def _extract_json_regex(response: str) -> Optional[dict]:
+    """Implementação anterior de `extract_json_from_response` (regex gulosas), para comparação."""
+    response = re.sub(r'^```json\s*', '', response, flags=re.MULTILINE)
+    response = re.sub(r'^```\s*$', '', response, flags=re.MULTILINE)
+    response = response.strip()
+
+    try:
+        return json.loads(response)
+    except json.JSONDecodeError:
+        pass
+
+    for pattern in (r'\{[\s\S]*\}', r'\[[\s\S]*\]'):
+        for match in re.findall(pattern, response):
+            try:
+                return json.loads(match)
+            except json.JSONDecodeError:
+                continue
+
+    return None
+
+
+def load_corpus(path: str) -> list[str]:
+    """Lê as respostas gravadas no cache de respostas do LLM (SQLite)."""
+    with sqlite3.connect(path) as conn:
+        return [row[0] for row in conn.execute("SELECT response FROM responses")]
+
+
+def synthetic_corpus(size: int = 200, seed: int = 20) -> list[str]:
+    """
+    Gera respostas bagunçadas no estilo das que os modelos devolvem: prosa
+    antes e depois, blocos markdown, chaves soltas no texto e respostas
+    longas cheias de chaves sem JSON válido.
+    """
+    rng = random.Random(seed)
+    words = "magia alvo dano fogo cena pericia teste defesa poder efeito".split()
+    corpus = []
+
+    for i in range(size):
+        entity = {
+            "id": f"entidade_{i}",
+            "name": f"Entidade {i}",
+            "description": " ".join(rng.choices(words, k=rng.randint(20, 400))),
+            "effects": [{"type": rng.choice(words), "value": "{x}"} for _ in range(rng.randint(0, 8))],
+        }
+        body = json.dumps(entity, ensure_ascii=False, indent=rng.choice([None, 2]))
+        prose = " ".join(rng.choices(words, k=rng.randint(5, 60)))
+        kind = i % 5
+
+        if kind == 0:
+            corpus.append(body)
+        elif kind == 1:
+            corpus.append(f"Claro! Aqui está:\n```json\n{body}\n```\nEspero ter ajudado.")
+        elif kind == 2:
+            corpus.append(f"{prose} {{nota: {prose}}}\n{body}\nObservação: campos {{opcionais}} omitidos.")
+        elif kind == 3:
+            corpus.append(f"{body}\n\nAlternativa:\n{body}")
+        else:
+            corpus.append(prose + " {" * rng.randint(200, 2000) + prose)
+
+    return corpus
+
+
+def bench_json(corpus: list[str], repeat: int = 3) -> list[dict]:
+    """
+    Compara a extração de JSON atual com a implementação por regex.
+
+    Returns:
+        Lista com {"name", "seconds", "found", "worst"} por implementação
+    """
+    implementations: list[tuple[str, Callable]] = [
+        ("regex (anterior)", _extract_json_regex),
+        ("raw_decode (atual)", extract_json_from_response),
+    ]
+    results = []
+
+    for name, extract in implementations:
+        best = None
+        worst = 0.0
+        found = 0
+        for _ in range(repeat):
+            found = 0
+            start = time.perf_counter()
+            for response in corpus:
+                item_start = time.perf_counter()
+                if extract(response) is not None:
+                    found += 1
+                worst = max(worst, time.perf_counter() - item_start)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        results.append({"name": name, "seconds": best, "found": found, "worst": worst})
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do extrator de PDF do Tormenta 20")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    extraction = subparsers.add_parser("extraction", help="Extração de páginas com N processos")
+    extraction.add_argument("pdf_path", help="Caminho para o PDF")
+    extraction.add_argument("--workers", "-w", type=int, nargs="+",
+                            default=[1, 2, 4, os.cpu_count() or 1],
+                            help="Números de workers a comparar (o primeiro é a referência)")
+    extraction.add_argument("--repeat", "-r", type=int, default=1,
+                            help="Repetições por configuração (usa o melhor tempo)")
+
+    json_parser = subparsers.add_parser("json", help="Extração de JSON das respostas do modelo")
+    json_parser.add_argument("--corpus",
+                             help="Cache de respostas (SQLite) com respostas gravadas; "
+                                  "sem ele, usa um corpus sintético")
+    json_parser.add_argument("--repeat", "-r", type=int, default=3,
+                             help="Repetições (usa o melhor tempo)")
+
+    args = parser.parse_args()
+
+    if args.benchmark == "extraction":
+        print(f"CPUs disponíveis: {os.cpu_count()}")
+        print(f"{'workers':>8} {'tempo (s)':>10} {'speedup':>8}")
+        for result in bench_extraction(args.pdf_path, args.workers, args.repeat):
+            print(f"{result['workers']:>8} {result['seconds']:>10.2f} {result['speedup']:>7.2f}x")
+
+    elif args.benchmark == "json":
+        corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+        print(f"Respostas: {len(corpus)} ({sum(map(len, corpus)) / 1024:.0f} KiB)")
+        print(f"{'implementação':<18} {'tempo (s)':>10} {'pior (ms)':>10} {'com JSON':>9}")
+        for result in bench_json(corpus, args.repeat):
+            print(f"{result['name']:<18} {result['seconds']:>10.3f} "
+                  f"{result['worst'] * 1000:>10.1f} {result['found']:>9}")
+
+
+if __name__ == "__main__":
+    main()
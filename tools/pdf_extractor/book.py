@@ -0,0 +1,396 @@
+"""
+Extração do livro inteiro do Tormenta 20 em uma única execução.
+
+O PDF é lido uma vez e as entidades de todas as seções do manifesto passam
+pelo mesmo conjunto de workers e pela mesma conexão com o Ollama. Cada tipo
+é gravado em src/json/<tipo>.
+
+Uso:
+    python book.py <pdf_path> [--manifest manifest.json] [--concurrency N]
+
+Exemplo:
+    python book.py tormenta20.pdf --write-manifest manifest.json
+    python book.py tormenta20.pdf --manifest manifest.json --concurrency 4
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Generator, Iterable, Optional, Union
+
+from tqdm import tqdm
+
+from journal import RunJournal
+from pdf_extractor import (
+    DEFAULT_CACHE_DIR,
+    SECTION_TO_ENTITY_TYPE,
+    PDFExtractor,
+    get_entity_pattern,
+    open_extractor,
+)
+from pipeline import (
+    DEFAULT_MODEL,
+    DEFAULT_NUM_CTX,
+    OLLAMA_URL,
+    SPECULATIVE_TYPES,
+    add_run_arguments,
+    connect_client,
+    default_output_dir,
+    order_longest_first,
+    print_backend_report,
+    print_cascade_report,
+    run_options,
+    run_stages,
+    save_result,
+)
+from generation_limits import DEFAULT_STATS_PATH
+from prompts import PROMPT_FALLBACKS, PROMPTS
+from response_cache import DEFAULT_RESPONSE_CACHE
+
+
+def default_manifest(extractor: PDFExtractor) -> dict[str, str]:
+    """
+    Manifesto padrão: seções do índice que aparecem em SECTION_TO_ENTITY_TYPE.
+
+    Seções contidas em outra seção do mesmo tipo (ex.: "humano" dentro de
+    "racas") ficam de fora, para as entidades não serem extraídas duas vezes.
+
+    Returns:
+        Dicionário seção -> tipo de entidade, na ordem das páginas
+    """
+    manifest = {}
+    covered: list[tuple[str, int, int]] = []
+
+    for slug, info in sorted(extractor.sections.items(), key=lambda item: item[1]["start_page"]):
+        entity_type = SECTION_TO_ENTITY_TYPE.get(slug)
+        if not entity_type:
+            continue
+        if any(
+            covered_type == entity_type and start <= info["start_page"] and info["end_page"] <= end
+            for covered_type, start, end in covered
+        ):
+            continue
+        manifest[slug] = entity_type
+        covered.append((entity_type, info["start_page"], info["end_page"]))
+
+    return manifest
+
+
+def manifest_entry(entry: Union[str, dict]) -> tuple[str, int]:
+    """
+    Tipo de entidade e prioridade de uma seção do manifesto.
+
+    A entrada é o tipo ("magias") ou um objeto com o tipo e a prioridade de
+    despacho com --longest-first ({"entity_type": "criaturas", "priority": 1}).
+    """
+    if isinstance(entry, str):
+        return entry, 0
+    return entry["entity_type"], entry.get("priority", 0)
+
+
+def _unique_keys(pairs: list[tuple[str, Any]]) -> dict:
+    """Monta um objeto JSON recusando chaves repetidas (o json padrão fica com a última)."""
+    keys = [key for key, _ in pairs]
+    repeated = sorted({key for key in keys if keys.count(key) > 1})
+    if repeated:
+        raise ValueError(f"Seções repetidas no manifesto: {repeated}")
+    return dict(pairs)
+
+
+def load_manifest(path: str) -> dict[str, Union[str, dict]]:
+    """
+    Lê um manifesto JSON ({"seção": "tipo_de_entidade", ...}) e valida os tipos.
+
+    Seções repetidas são recusadas; seções diferentes que apontam para o mesmo
+    slug só são detectadas por `run_book`, que resolve os slugs no PDF.
+    """
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f, object_pairs_hook=_unique_keys)
+
+    try:
+        types = [manifest_entry(entry)[0] for entry in manifest.values()]
+    except (KeyError, TypeError, AttributeError):
+        raise ValueError("Cada seção do manifesto precisa de um tipo de entidade")
+
+    unknown = [
+        entity_type for entity_type in types
+        if PROMPT_FALLBACKS.get(entity_type, entity_type) not in PROMPTS
+    ]
+    if unknown:
+        raise ValueError(f"Tipos de entidade desconhecidos no manifesto: {unknown}")
+    return manifest
+
+
+def run_book(
+    pdf_path: str,
+    manifest: Optional[dict[str, Union[str, dict]]] = None,
+    model: Union[str, list[str]] = DEFAULT_MODEL,
+    output_root: str = None,
+    dry_run: bool = False,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    pdf_workers: int = 1,
+    text_file: str = None,
+    toc_start: int = 3,
+    toc_end: int = 6,
+    use_outline: bool = True,
+    concurrency: int = 1,
+    ollama_url: Union[str, list[str]] = OLLAMA_URL,
+    response_cache: str = DEFAULT_RESPONSE_CACHE,
+    resume: bool = False,
+    stream: bool = False,
+    structured_output: bool = False,
+    batch_size: int = 1,
+    reuse_prefix: bool = False,
+    num_ctx: int = DEFAULT_NUM_CTX,
+    generation_stats: str = DEFAULT_STATS_PATH,
+    adaptive_limits: bool = True,
+    longest_first: bool = False,
+    speculative: int = 1,
+    speculative_types: Iterable[str] = SPECULATIVE_TYPES,
+    coalesce: bool = True
+) -> dict:
+    """
+    Extrai todas as seções de um manifesto em uma única execução.
+
+    Args:
+        pdf_path: Caminho para o PDF
+        manifest: Seção -> tipo de entidade, ou -> {"entity_type", "priority"}
+            (None usa `default_manifest`)
+        output_root: Diretório com um subdiretório por tipo (padrão: src/json)
+        longest_first: Despacha as entidades de todas as seções da mais cara para a
+            mais barata, respeitando as prioridades do manifesto
+
+    Os demais argumentos são os de `run_pipeline`.
+
+    Returns:
+        Estatísticas por seção, com o tempo e a vazão de cada uma
+    """
+    print("Lendo o PDF...")
+    extractor = open_extractor(
+        pdf_path, cache_dir=cache_dir, workers=pdf_workers, text_file=text_file,
+        toc_start=toc_start, toc_end=toc_end, use_outline=use_outline
+    )
+    if manifest is None:
+        manifest = default_manifest(extractor)
+
+    # Resolver as seções antes de começar
+    sections = {}
+    for section, entry in manifest.items():
+        entity_type, priority = manifest_entry(entry)
+        try:
+            slug, _ = extractor.resolve_section(section)
+        except ValueError as e:
+            print(f"Aviso: {e}; seção ignorada.")
+            continue
+        if slug in sections:
+            print(f"Erro: as seções '{sections[slug]['name']}' e '{section}' do manifesto "
+                  f"correspondem à mesma seção '{slug}'.")
+            sys.exit(1)
+        output_path = Path(output_root) / entity_type if output_root else default_output_dir(entity_type)
+        sections[slug] = {
+            "name": section,
+            "entity_type": entity_type,
+            "priority": priority,
+            "output_path": output_path,
+            "journal": RunJournal.for_section(output_path, slug),
+            "stats": {
+                "entity_type": entity_type,
+                "total": 0,
+                "success": 0,
+                "failed": 0,
+                "skipped": 0,
+                "errors": [],
+                "eval_count": 0,
+                "started": None,
+                "finished": None,
+            },
+        }
+
+    if not sections:
+        print("Erro: nenhuma seção do manifesto foi encontrada no PDF.")
+        sys.exit(1)
+
+    print(f"\n{'='*60}")
+    print("Extração do Livro - Tormenta 20")
+    print(f"{'='*60}")
+    print(f"PDF: {pdf_path}")
+    print(f"Modelo: {model if isinstance(model, str) else ' -> '.join(model)}")
+    print(f"Concorrência: {concurrency}")
+    for slug, info in sections.items():
+        print(f"  {slug} -> {info['entity_type']} ({info['output_path']})")
+    print(f"{'='*60}\n")
+
+    if dry_run:
+        for slug, info in sections.items():
+            pattern = get_entity_pattern(slug, info["entity_type"])
+            info["stats"]["total"] = sum(1 for _ in extractor.iter_entities(slug, pattern))
+            print(f"{slug}: {info['stats']['total']} entidades")
+        return {slug: info["stats"] for slug, info in sections.items()}
+
+    client = connect_client(
+        model=model,
+        ollama_url=ollama_url,
+        concurrency=concurrency,
+        response_cache=response_cache,
+        stream=stream,
+        structured_output=structured_output,
+        reuse_prefix=reuse_prefix,
+        num_ctx=num_ctx,
+        generation_stats=generation_stats,
+        adaptive_limits=adaptive_limits,
+        speculative=speculative,
+        speculative_types=speculative_types,
+        coalesce=coalesce
+    )
+
+    def all_entities() -> Generator[dict, None, None]:
+        for slug, info in sections.items():
+            stats = info["stats"]
+            info["output_path"].mkdir(parents=True, exist_ok=True)
+            done = info["journal"].completed() if resume else {}
+
+            pattern = get_entity_pattern(slug, info["entity_type"])
+            for entity in extractor.iter_entities(slug, pattern):
+                if RunJournal.content_hash(entity["content"]) in done:
+                    stats["skipped"] += 1
+                    continue
+                yield {**entity, "section": slug, "entity_type": info["entity_type"]}
+
+    def dispatched(entities: Iterable[dict]) -> Generator[dict, None, None]:
+        # O tempo de cada seção conta a partir da primeira entidade despachada:
+        # com --longest-first, as seções se intercalam e não começam juntas
+        for entity in entities:
+            stats = sections[entity["section"]]["stats"]
+            if stats["started"] is None:
+                stats["started"] = time.perf_counter()
+            yield entity
+
+    started = time.perf_counter()
+    entities = all_entities()
+    if longest_first:
+        priorities = {slug: info["priority"] for slug, info in sections.items()}
+        entities = order_longest_first(entities, None, client.settings.limits, priorities)
+    results = run_stages(
+        dispatched(entities), client, None, concurrency=concurrency, batch_size=batch_size
+    )
+    for entity, json_data, errors, metrics in tqdm(results, desc="Processando"):
+        info = sections[entity["section"]]
+        stats = info["stats"]
+        save_result(info["output_path"], info["journal"], stats, entity, json_data, errors, metrics)
+        if not metrics.get("cached"):
+            stats["eval_count"] += metrics.get("eval_count") or 0
+        stats["finished"] = time.perf_counter()
+
+    elapsed = time.perf_counter() - started
+    client.close()
+
+    report = {slug: info["stats"] for slug, info in sections.items()}
+    print_report(
+        report, elapsed,
+        client.cache.hits if client.cache else None,
+        client.settings.coalescer.shared if client.settings.coalescer else None
+    )
+    print_backend_report(client)
+    print_cascade_report(client, dict.fromkeys(info["entity_type"] for info in sections.values()))
+    return report
+
+
+def print_report(
+    report: dict,
+    elapsed: float,
+    cache_hits: Optional[int] = None,
+    shared: Optional[int] = None
+) -> None:
+    """Relatório consolidado, com o tempo e a vazão de cada seção."""
+    print(f"\n{'='*60}")
+    print("Relatório Final")
+    print(f"{'='*60}")
+    print(f"{'seção':<24} {'tipo':<18} {'ok':>5} {'falhas':>6} {'puladas':>7} "
+          f"{'tempo (s)':>9} {'ent/min':>8} {'tok/s':>7}")
+
+    for slug, stats in report.items():
+        seconds = (stats["finished"] - stats["started"]) if stats["finished"] else 0.0
+        per_minute = stats["total"] * 60 / seconds if seconds else 0.0
+        tokens = stats["eval_count"] / seconds if seconds else 0.0
+        print(f"{slug:<24} {stats['entity_type']:<18} {stats['success']:>5} {stats['failed']:>6} "
+              f"{stats['skipped']:>7} {seconds:>9.1f} {per_minute:>8.1f} {tokens:>7.1f}")
+
+    total = sum(stats["total"] for stats in report.values())
+    print(f"\nTotal processado: {total} em {elapsed:.1f}s "
+          f"({total * 60 / elapsed if elapsed else 0:.1f} entidades/min)")
+    print(f"Sucesso: {sum(stats['success'] for stats in report.values())}")
+    print(f"Falhas: {sum(stats['failed'] for stats in report.values())}")
+    if cache_hits:
+        print(f"Respostas do cache: {cache_hits}")
+    if shared:
+        print(f"Repetidas (inferência compartilhada): {shared}")
+
+    errors = [(slug, error) for slug, stats in report.items() for error in stats["errors"]]
+    if errors:
+        print("\nEntidades com erro:")
+        for slug, error in errors:
+            print(f"  - [{slug}] {error['entity']}")
+            for e in error["errors"]:
+                print(f"      {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extração de todas as seções do Tormenta 20 em uma única execução",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Exemplos:
+  # Gravar o manifesto padrão para edição
+  python book.py tormenta20.pdf --write-manifest manifest.json
+
+  # Extrair as seções do manifesto com 4 requisições simultâneas
+  python book.py tormenta20.pdf --manifest manifest.json --concurrency 4
+
+  # Ver quantas entidades cada seção tem
+  python book.py tormenta20.pdf --dry-run
+        """
+    )
+
+    parser.add_argument("pdf_path", help="Caminho para o PDF do Tormenta 20")
+    parser.add_argument("--manifest",
+                        help="JSON com seção -> tipo de entidade (padrão: seções de SECTION_TO_ENTITY_TYPE)")
+    parser.add_argument("--write-manifest",
+                        help="Grava o manifesto padrão neste arquivo e sai")
+    add_run_arguments(parser)
+    parser.add_argument("--output-root", "-o",
+                        help="Diretório de saída, com um subdiretório por tipo (padrão: src/json)")
+    parser.add_argument("--dry-run", "-n", action="store_true",
+                        help="Não processa, apenas conta as entidades de cada seção")
+
+    args = parser.parse_args()
+    options = run_options(args)
+
+    if args.write_manifest:
+        extractor = open_extractor(
+            args.pdf_path, cache_dir=options["cache_dir"], toc_start=options["toc_start"],
+            toc_end=options["toc_end"], use_outline=options["use_outline"]
+        )
+        with open(args.write_manifest, "w", encoding="utf-8") as f:
+            json.dump(default_manifest(extractor), f, ensure_ascii=False, indent=2)
+        print(f"Manifesto gravado em {args.write_manifest}")
+        sys.exit(0)
+
+    try:
+        manifest = load_manifest(args.manifest) if args.manifest else None
+    except (OSError, ValueError) as e:
+        print(f"Erro: {e}")
+        sys.exit(1)
+
+    run_book(
+        pdf_path=args.pdf_path,
+        manifest=manifest,
+        output_root=args.output_root,
+        dry_run=args.dry_run,
+        **options
+    )
+
+
+if __name__ == "__main__":
+    main()
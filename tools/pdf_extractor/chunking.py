@@ -0,0 +1,137 @@
+"""
+Orçamento de tokens e divisão de entidades grandes.
+
+Entidades longas (ex.: o capítulo inteiro de uma classe) não cabem no
+contexto do modelo ou geram um JSON maior que `num_predict`, que chega
+truncado. Aqui ficam a estimativa de tokens, a divisão do texto em partes
+nos subtítulos e a junção determinística dos JSONs das partes.
+"""
+
+import copy
+import math
+import re
+
+
+# Estimativa conservadora de caracteres por token para texto em português
+CHARS_PER_TOKEN = 3
+
+# Tokens de saída estimados por token de conteúdo (o JSON repete o texto e acrescenta a estrutura)
+OUTPUT_RATIO = 1.5
+
+# Linhas que iniciam um novo bloco: subtítulos curtos sem pontuação final
+# ("Habilidades de Classe") ou títulos em linha ("Ataque Especial. A partir...")
+SUBHEADER_PATTERN = re.compile(
+    r'^(?:[A-ZÀ-Ý][^\n.:;,!?]{1,60}|[A-ZÀ-Ý][\wÀ-ÿ\' -]{1,40}\.\s.*)$',
+    re.MULTILINE
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa (por cima) do número de tokens de um texto."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def content_budget(fixed_tokens: int, num_ctx: int, num_predict: int) -> int:
+    """
+    Máximo de tokens de conteúdo que uma requisição comporta.
+
+    O conteúdo precisa caber no contexto junto com a parte fixa do prompt e
+    a resposta, e o JSON gerado a partir dele precisa caber em `num_predict`.
+
+    Args:
+        fixed_tokens: Tokens do system prompt e do prefixo
+        num_ctx: Tamanho do contexto do modelo
+        num_predict: Máximo de tokens na resposta
+
+    Returns:
+        Orçamento em tokens (zero ou negativo se nem o prompt fixo cabe)
+    """
+    return min(num_ctx - fixed_tokens - num_predict, int(num_predict / OUTPUT_RATIO))
+
+
+def _split_lines(text: str, max_chars: int) -> list[str]:
+    """Divide um bloco grande em linhas (ou palavras, em linhas enormes) até `max_chars`."""
+    pieces = []
+    for line in text.split("\n"):
+        while len(line) > max_chars:
+            cut = line.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(line[:cut])
+            line = line[cut:].lstrip()
+        pieces.append(line)
+    return pieces
+
+
+def split_content(content: str, max_tokens: int) -> list[str]:
+    """
+    Divide o conteúdo em partes de até `max_tokens` tokens estimados.
+
+    Corta preferencialmente nos subtítulos (SUBHEADER_PATTERN) e junta
+    blocos consecutivos enquanto couberem; blocos maiores que o orçamento
+    são cortados em linhas.
+
+    Returns:
+        Lista de partes, na ordem do texto
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    starts = [match.start() for match in SUBHEADER_PATTERN.finditer(content) if match.start() > 0]
+    bounds = [0, *starts, len(content)]
+    blocks = [content[a:b].strip("\n") for a, b in zip(bounds, bounds[1:])]
+
+    pieces = []
+    for block in blocks:
+        if len(block) > max_chars:
+            pieces.extend(_split_lines(block, max_chars))
+        elif block:
+            pieces.append(block)
+
+    parts = []
+    current = ""
+    for piece in pieces:
+        candidate = f"{current}\n{piece}" if current else piece
+        if len(candidate) > max_chars and current:
+            parts.append(current)
+            current = piece
+        else:
+            current = candidate
+    if current:
+        parts.append(current)
+
+    return parts
+
+
+def _merge_into(target: dict, source: dict) -> None:
+    for key, value in source.items():
+        current = target.get(key)
+        if current is None:
+            target[key] = copy.deepcopy(value)
+        elif isinstance(current, dict) and isinstance(value, dict):
+            _merge_into(current, value)
+        elif isinstance(current, list) and isinstance(value, list):
+            for item in value:
+                same = None
+                if isinstance(item, dict) and item.get("id"):
+                    same = next(
+                        (x for x in current if isinstance(x, dict) and x.get("id") == item["id"]),
+                        None
+                    )
+                if same is not None:
+                    _merge_into(same, item)
+                elif item not in current:
+                    current.append(copy.deepcopy(item))
+        # Valores simples: vale o da primeira parte que o preencheu
+
+
+def merge_parts(parts: list[dict]) -> dict:
+    """
+    Junta os JSONs das partes de uma entidade em um único documento.
+
+    Percorre as partes em ordem: campos ausentes ou nulos são preenchidos,
+    objetos são mesclados recursivamente, listas recebem os itens novos
+    (itens com o mesmo "id" são mesclados) e valores simples mantêm o da
+    primeira parte. O resultado depende só das partes e da ordem delas.
+    """
+    merged = copy.deepcopy(parts[0])
+    for part in parts[1:]:
+        _merge_into(merged, part)
+    return merged
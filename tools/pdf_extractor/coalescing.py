@@ -0,0 +1,118 @@
+"""
+Coalescência de requisições repetidas dentro de uma execução.
+
+As seções do índice não se sobrepõem (cada uma termina na página anterior
+à da seguinte), mas o mesmo texto de entidade pode aparecer em mais de uma
+seção do manifesto, ou mais de uma vez na mesma seção, e tipos como
+`poderes` e `poderes_combate` usam o mesmo prompt (ver PROMPT_FALLBACKS)
+e padrões quase iguais. Assim o mesmo texto chega ao modelo várias vezes
+em uma extração do livro. Pedidos com o mesmo conteúdo e o mesmo tipo de
+prompt compartilham uma única inferência: o primeiro faz o trabalho, os
+que chegam enquanto ele está em andamento esperam, e os seguintes recebem
+o resultado guardado.
+"""
+
+import copy
+import hashlib
+import threading
+from typing import Callable, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+
+def normalize_content(content: str) -> str:
+    """Conteúdo sem diferenças de espaçamento e quebras de linha."""
+    return " ".join(content.split())
+
+
+class _Entry:
+    """Resultado de uma chave, pronto ou em andamento."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class RequestCoalescer:
+    """Resultados por chave, compartilhados entre as threads de uma execução."""
+
+    def __init__(self):
+        self.shared = 0
+        self._lock = threading.Lock()
+        self._entries: dict[str, _Entry] = {}
+
+    @staticmethod
+    def key(prompt_type: str, content: str) -> str:
+        """Chave do pedido: hash do tipo de prompt e do conteúdo normalizado."""
+        raw = f"{prompt_type}\0{normalize_content(content)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def __contains__(self, key: str) -> bool:
+        """Se a chave já foi pedida (em andamento ou concluída)."""
+        with self._lock:
+            return key in self._entries
+
+    def run(
+        self,
+        key: str,
+        compute: Callable[[], T],
+        keep: Optional[Callable[[T], bool]] = None
+    ) -> tuple[T, bool]:
+        """
+        Calcula o resultado da chave uma única vez.
+
+        O primeiro pedido chama `compute`; os pedidos simultâneos esperam e
+        recebem uma cópia do mesmo resultado (ou a mesma exceção). O guardado
+        é uma cópia separada da devolvida ao primeiro pedido, que pode alterar
+        a sua (ex.: preencher o `id`) enquanto os outros copiam. Resultados
+        para os quais `keep` retorna False, e exceções, não ficam guardados:
+        um pedido posterior calcula de novo.
+
+        Returns:
+            Tupla (resultado, compartilhado)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = self._entries[key] = _Entry()
+            else:
+                self.shared += 1
+
+        if not owner:
+            entry.done.wait()
+            if entry.error is not None:
+                raise entry.error
+            return copy.deepcopy(entry.result), True
+
+        try:
+            result = compute()
+            entry.result = copy.deepcopy(result)
+        except BaseException as e:
+            entry.error = e
+            with self._lock:
+                self._entries.pop(key, None)
+            raise
+        else:
+            if keep is not None and not keep(result):
+                with self._lock:
+                    self._entries.pop(key, None)
+        finally:
+            entry.done.set()
+
+        return result, False
+
+    def settle(self, key: str, result) -> None:
+        """
+        Guarda um resultado obtido fora de `run` (ex.: em lote), se a chave ainda não existe.
+
+        Guarda uma cópia: quem chamou continua livre para alterar o seu.
+        """
+        with self._lock:
+            if key in self._entries:
+                return
+            entry = self._entries[key] = _Entry()
+            entry.result = copy.deepcopy(result)
+            entry.done.set()
@@ -0,0 +1,174 @@
+"""
+Limites de geração aprendidos por tipo de entidade.
+
+Guarda, para cada tipo, os tokens gerados (`eval_count`) e a duração das
+chamadas recentes ao modelo. A partir de um percentil alto dessas
+amostras, com uma folga, define o `num_predict` e o timeout de cada
+requisição: uma condição de uma linha não pode gerar 4096 tokens, e uma
+classe de dez páginas não estoura um timeout pensado para respostas curtas.
+
+Guarda também quantas entidades de cada tipo cada modelo da cascata
+acertou, para decidir por tipo quais modelos valem a tentativa. Sem
+adaptação (`adaptive=False`), as estatísticas continuam sendo registradas,
+mas `num_predict` e `timeout` retornam sempre os valores padrão.
+"""
+
+import json
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+
+DEFAULT_STATS_PATH = Path.home() / ".cache" / "tormenta20" / "generation_stats.json"
+
+# Amostras guardadas por tipo (as mais recentes)
+WINDOW = 200
+
+# Amostras necessárias antes de sair dos valores padrão
+MIN_SAMPLES = 5
+
+# Limites mínimos, para não cortar respostas legítimas de tipos pequenos
+MIN_NUM_PREDICT = 256
+MIN_TIMEOUT = 30.0
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Percentil pelo método nearest-rank."""
+    ordered = sorted(values)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class GenerationLimits:
+    """Estatísticas de geração por tipo de entidade, persistidas em JSON."""
+
+    def __init__(
+        self,
+        path: Union[str, Path] = DEFAULT_STATS_PATH,
+        fraction: float = 0.95,
+        headroom: float = 1.5,
+        adaptive: bool = True
+    ):
+        self.path = Path(path)
+        self.fraction = fraction
+        self.headroom = headroom
+        self.adaptive = adaptive
+        self._lock = threading.Lock()
+        self._samples: dict[str, dict] = {}
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self._samples = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    def observe(self, entity_type: str, metrics: dict, content_tokens: Optional[int] = None) -> None:
+        """
+        Registra as métricas de uma chamada ao modelo (ignora respostas do cache).
+
+        Com `content_tokens` (tokens estimados do conteúdo enviado), registra
+        também os tokens gerados e os segundos por token de conteúdo, usados
+        para estimar o custo de entidades ainda não processadas e os limites
+        dos lotes (ver `for_content`).
+        """
+        if metrics.get("cached") or not metrics.get("eval_count"):
+            return
+
+        with self._lock:
+            samples = self._samples.setdefault(entity_type, {})
+            samples["eval_count"] = (samples.get("eval_count", []) + [metrics["eval_count"]])[-WINDOW:]
+            if content_tokens:
+                ratio = metrics["eval_count"] / content_tokens
+                samples["eval_per_token"] = (samples.get("eval_per_token", []) + [ratio])[-WINDOW:]
+            if metrics.get("duration"):
+                samples["duration"] = (samples.get("duration", []) + [metrics["duration"]])[-WINDOW:]
+                if content_tokens:
+                    rate = metrics["duration"] / content_tokens
+                    samples["seconds_per_token"] = (samples.get("seconds_per_token", []) + [rate])[-WINDOW:]
+
+    def _learned(self, entity_type: str, field: str) -> Optional[float]:
+        if not self.adaptive:
+            return None
+        with self._lock:
+            values = self._samples.get(entity_type, {}).get(field, [])
+            if len(values) < MIN_SAMPLES:
+                return None
+            return percentile(values, self.fraction) * self.headroom
+
+    def num_predict(self, entity_type: str, default: int) -> int:
+        """Máximo de tokens na resposta para o tipo (nunca acima de `default`)."""
+        learned = self._learned(entity_type, "eval_count")
+        if learned is None:
+            return default
+        return min(max(math.ceil(learned), MIN_NUM_PREDICT), default)
+
+    def timeout(self, entity_type: str, default: float) -> float:
+        """Timeout de uma requisição do tipo, em segundos."""
+        learned = self._learned(entity_type, "duration")
+        if learned is None:
+            return default
+        return max(learned, MIN_TIMEOUT)
+
+    def for_content(
+        self,
+        entity_type: str,
+        content_tokens: int,
+        default_num_predict: int,
+        default_timeout: float
+    ) -> tuple[int, float]:
+        """
+        `num_predict` e timeout de uma requisição com `content_tokens` de conteúdo.
+
+        Usado nos lotes, em que uma requisição leva várias entidades: os
+        tokens gerados e os segundos por token de conteúdo aprendidos (no
+        mesmo percentil e com a mesma folga dos limites por entidade) são
+        multiplicados pelo tamanho do conteúdo. `num_predict` nunca passa de
+        `default_num_predict`; sem amostras, valem os padrões.
+        """
+        num_predict, timeout = default_num_predict, default_timeout
+        tokens_per_token = self._learned(entity_type, "eval_per_token")
+        if tokens_per_token is not None:
+            learned = math.ceil(tokens_per_token * content_tokens)
+            num_predict = min(max(learned, MIN_NUM_PREDICT), default_num_predict)
+        seconds_per_token = self._learned(entity_type, "seconds_per_token")
+        if seconds_per_token is not None:
+            timeout = max(seconds_per_token * content_tokens, MIN_TIMEOUT)
+        return num_predict, timeout
+
+    def seconds_per_token(self, entity_type: str) -> Optional[float]:
+        """Mediana dos segundos por token de conteúdo do tipo, ou None sem amostras suficientes."""
+        with self._lock:
+            values = self._samples.get(entity_type, {}).get("seconds_per_token", [])
+            if len(values) < MIN_SAMPLES:
+                return None
+            return percentile(values, 0.5)
+
+    def record_model(self, entity_type: str, model: str, success: bool) -> None:
+        """Conta uma tentativa do modelo no tipo de entidade e se ela produziu um JSON válido."""
+        with self._lock:
+            counts = self._samples.setdefault(entity_type, {}).setdefault("models", {})
+            attempts, successes = counts.get(model, [0, 0])
+            counts[model] = [attempts + 1, successes + int(success)]
+
+    def model_hit_rates(self, entity_type: str) -> dict[str, tuple[int, int]]:
+        """Modelo -> (tentativas, acertos) no tipo de entidade, acumulados entre execuções."""
+        with self._lock:
+            counts = self._samples.get(entity_type, {}).get("models", {})
+            return {model: (attempts, successes) for model, (attempts, successes) in counts.items()}
+
+    def samples(self, entity_type: str) -> int:
+        """Número de amostras guardadas para o tipo."""
+        with self._lock:
+            return len(self._samples.get(entity_type, {}).get("eval_count", []))
+
+    def save(self) -> None:
+        """Grava as estatísticas de forma atômica."""
+        with self._lock:
+            data = json.dumps(self._samples)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
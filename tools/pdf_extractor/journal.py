@@ -0,0 +1,111 @@
+"""
+Diário (journal) das execuções do pipeline.
+
+Cada entidade processada gera uma linha JSON em um arquivo só de acréscimo,
+gravada em disco (fsync) antes de seguir para a próxima. Se a execução for
+interrompida, o diário indica quais entidades já foram concluídas e com qual
+conteúdo, permitindo retomar só o que falta ou mudou.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional, Union
+
+
+class RunJournal:
+    """Diário JSONL de uma seção, compartilhado pelas execuções que a processam."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.run_id = uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_section(cls, output_path: Union[str, Path], section_slug: str) -> "RunJournal":
+        """
+        Diário de uma seção no diretório de saída.
+
+        O nome vem do slug resolvido da seção (ver `resolve_section`), então
+        pipeline.py e book.py usam o mesmo arquivo para a mesma seção, mesmo
+        que ela tenha sido pedida por um slug parcial. Diários de versões
+        antigas, gravados com o slug sem sublinhados, são renomeados.
+        """
+        path = Path(output_path) / f".journal_{section_slug}.jsonl"
+        legacy = path.with_name(f".journal_{section_slug.replace('_', '')}.jsonl")
+        if legacy != path and legacy.exists() and not path.exists():
+            os.replace(legacy, path)
+        return cls(path)
+
+    @staticmethod
+    def content_hash(content: str) -> str:
+        """Hash do conteúdo de uma entidade."""
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def completed(self) -> dict[str, dict]:
+        """
+        Entidades concluídas com sucesso em execuções anteriores.
+
+        Linhas incompletas (de uma execução interrompida no meio da escrita)
+        são ignoradas, assim como registros cujo arquivo de saída não existe
+        mais.
+
+        Returns:
+            Dicionário hash_do_conteúdo -> registro mais recente
+        """
+        done = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+                    if record.get("outcome") == "success":
+                        done[record["hash"]] = record
+                    else:
+                        done.pop(record.get("hash"), None)
+        except FileNotFoundError:
+            return {}
+
+        return {
+            content_hash: record
+            for content_hash, record in done.items()
+            if record.get("file") and (self.path.parent / record["file"]).exists()
+        }
+
+    def record(
+        self,
+        header: str,
+        content_hash: str,
+        outcome: str,
+        output_file: Optional[str] = None,
+        errors: Optional[list[str]] = None,
+        metrics: Optional[dict] = None
+    ) -> None:
+        """Acrescenta o resultado de uma entidade e força a gravação em disco."""
+        entry = {
+            "run": self.run_id,
+            "time": time.time(),
+            "header": header,
+            "hash": content_hash,
+            "outcome": outcome,
+            "file": output_file,
+        }
+        if errors:
+            entry["errors"] = errors
+        if metrics:
+            entry["metrics"] = metrics
+
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
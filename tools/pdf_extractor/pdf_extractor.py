@@ -3,11 +3,35 @@ Extrator de texto do PDF do Tormenta 20.
 Processa o índice e divide o conteúdo em seções para processamento.
 """
 
+import hashlib
+import json
+import mmap
+import os
 import pdfplumber
 import re
+from pdfminer.pdfdocument import PDFNoOutlines
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdftypes import PDFObjRef, resolve1
+from pdfminer.psparser import PSLiteral
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Generator
-from dataclasses import dataclass
+from typing import Any, Generator, Optional, Union
+from dataclasses import asdict, dataclass
+
+
+# Versão da lógica de extração; incrementar invalida os caches em disco
+EXTRACTOR_VERSION = 2
+
+# Diretório padrão do cache de artefatos extraídos
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "tormenta20" / "pdf_extractor"
+
+# Páginas por tarefa na extração paralela
+PAGES_PER_TASK = 8
+
+# Páginas por arquivo do cache de páginas (pages_<bloco>.json)
+PAGES_PER_CACHE_FILE = 32
 
 
 @dataclass
@@ -18,40 +42,600 @@ class TableOfContentsEntry:
     level: int  # 0 = capítulo, 1 = seção, 2 = subseção
 
 
+def file_sha256(path: Union[str, Path]) -> str:
+    """Hash SHA-256 do conteúdo de um arquivo."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _extract_pages(pdf_path: Union[str, Path], numbers: list[int]) -> dict[int, str]:
+    """
+    Extrai o texto das páginas informadas (numeração a partir de 1).
+
+    Abre o PDF por conta própria, então pode rodar em outro processo.
+    """
+    texts = {}
+    with pdfplumber.open(pdf_path) as pdf:
+        for number in numbers:
+            page = pdf.pages[number - 1]
+            texts[number] = page.extract_text() or ""
+            # Libera o layout já processado; só o texto é mantido
+            page.close()
+    return texts
+
+
+class PageStore:
+    """
+    Texto das páginas extraídas.
+
+    Enquanto o livro é lido sob demanda, as páginas ficam em um dicionário.
+    Quando todas estão presentes, `compact()` as junta em um único buffer
+    (com os marcadores de página) e guarda o offset de cada página, de modo
+    que o texto completo e o texto de cada página compartilham a mesma
+    memória.
+    """
+
+    def __init__(self):
+        self._pending: dict[int, str] = {}
+        self._buffer: Optional[str] = None
+        self._marks = array("q")   # início do marcador de cada página
+        self._starts = array("q")  # início do texto de cada página
+
+    def __contains__(self, number: int) -> bool:
+        if self._buffer is not None:
+            return 1 <= number <= len(self._starts)
+        return number in self._pending
+
+    def __len__(self) -> int:
+        return len(self._starts) if self._buffer is not None else len(self._pending)
+
+    @staticmethod
+    def marker(number: int) -> str:
+        """Marcador que precede cada página no texto completo."""
+        return f"\n--- PÁGINA {number} ---\n"
+
+    @property
+    def is_compact(self) -> bool:
+        return self._buffer is not None
+
+    @property
+    def text(self) -> Optional[str]:
+        """Texto completo com marcadores, ou None se ainda não compactado."""
+        return self._buffer
+
+    def add(self, number: int, text: str) -> None:
+        if self._buffer is not None:
+            raise RuntimeError("PageStore já compactado")
+        self._pending[number] = text
+
+    def update(self, texts: dict[int, str]) -> None:
+        for number, text in texts.items():
+            self.add(number, text)
+
+    def get(self, number: int, default: str = "") -> str:
+        if self._buffer is None:
+            return self._pending.get(number, default)
+        if not 1 <= number <= len(self._starts):
+            return default
+        end = self._marks[number] if number < len(self._marks) else len(self._buffer)
+        return self._buffer[self._starts[number - 1]:end]
+
+    def items(self) -> Generator[tuple[int, str], None, None]:
+        numbers = range(1, len(self) + 1) if self._buffer is not None else sorted(self._pending)
+        for number in numbers:
+            yield number, self.get(number)
+
+    def compact(self, page_count: int) -> str:
+        """
+        Junta as páginas 1..page_count em um único buffer.
+
+        O buffer é montado em uma passada; o dicionário de páginas é
+        descartado em seguida, então o livro fica uma única vez na memória.
+        """
+        if self._buffer is not None:
+            return self._buffer
+
+        parts = []
+        offset = 0
+        for number in range(1, page_count + 1):
+            marker = self.marker(number)
+            page_text = self._pending[number]
+            self._marks.append(offset)
+            self._starts.append(offset + len(marker))
+            offset += len(marker) + len(page_text)
+            parts.append(marker)
+            parts.append(page_text)
+
+        self._buffer = "".join(parts)
+        self._pending = {}
+        return self._buffer
+
+    def page_at(self, offset: int) -> int:
+        """Página que contém o offset informado do texto completo."""
+        if self._buffer is None:
+            raise RuntimeError("PageStore ainda não compactado")
+        return max(bisect_right(self._marks, offset), 1)
+
+    def save(self, path: Union[str, Path], source_sha256: Optional[str] = None) -> None:
+        """
+        Grava o texto completo em UTF-8 e um índice de offsets ao lado.
+
+        O índice (`<path>.idx.json`) guarda os offsets de cada página em
+        caracteres e em bytes, para que `MappedPageStore` leia as páginas
+        direto do arquivo mapeado.
+        """
+        if self._buffer is None:
+            raise RuntimeError("PageStore ainda não compactado")
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        byte_marks, byte_starts = [], []
+        offset = 0
+
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            for number, page_text in self.items():
+                marker = self.marker(number).encode("utf-8")
+                data = page_text.encode("utf-8")
+                byte_marks.append(offset)
+                byte_starts.append(offset + len(marker))
+                f.write(marker)
+                f.write(data)
+                offset += len(marker) + len(data)
+
+        index = {
+            "version": EXTRACTOR_VERSION,
+            "source_sha256": source_sha256,
+            "marks": list(self._marks),
+            "byte_marks": byte_marks,
+            "byte_starts": byte_starts,
+        }
+        index_tmp = MappedPageStore.index_path(path).with_suffix(f".{os.getpid()}.tmp")
+        with open(index_tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp, path)
+        os.replace(index_tmp, MappedPageStore.index_path(path))
+
+
+class MappedPageStore:
+    """
+    Páginas lidas de um arquivo gravado por `PageStore.save`.
+
+    O arquivo é mapeado com mmap e cada página é decodificada só quando
+    pedida, então o livro não precisa ser carregado no heap do Python e
+    vários processos compartilham o mesmo cache de páginas do sistema.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.index_path(self.path), encoding="utf-8") as f:
+            index = json.load(f)
+
+        self.source_sha256: Optional[str] = index.get("source_sha256")
+        self._marks = array("q", index["marks"])
+        self._byte_marks = array("q", index["byte_marks"])
+        self._byte_starts = array("q", index["byte_starts"])
+
+        self._file = open(self.path, "rb")
+        if os.fstat(self._file.fileno()).st_size:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._data = b""
+
+    @staticmethod
+    def index_path(path: Union[str, Path]) -> Path:
+        path = Path(path)
+        return path.with_name(path.name + ".idx.json")
+
+    @staticmethod
+    def is_valid(path: Union[str, Path], source_sha256: Optional[str] = None) -> bool:
+        """Verifica se o arquivo e o índice existem e correspondem ao PDF."""
+        try:
+            with open(MappedPageStore.index_path(path), encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return False
+
+        if index.get("version") != EXTRACTOR_VERSION or not Path(path).exists():
+            return False
+        return source_sha256 is None or index.get("source_sha256") == source_sha256
+
+    def __contains__(self, number: int) -> bool:
+        return 1 <= number <= len(self._byte_starts)
+
+    def __len__(self) -> int:
+        return len(self._byte_starts)
+
+    @property
+    def is_compact(self) -> bool:
+        return True
+
+    @property
+    def text(self) -> str:
+        """
+        Texto completo, decodificado do arquivo inteiro a cada acesso.
+
+        Só para quem precisa do livro como uma string; buscas e trechos
+        usam `get` página a página (ver `PDFExtractor.find_section`).
+        """
+        return self._data[:].decode("utf-8")
+
+    def get(self, number: int, default: str = "") -> str:
+        if number not in self:
+            return default
+        end = self._byte_marks[number] if number < len(self._byte_marks) else len(self._data)
+        return self._data[self._byte_starts[number - 1]:end].decode("utf-8")
+
+    def items(self) -> Generator[tuple[int, str], None, None]:
+        for number in range(1, len(self) + 1):
+            yield number, self.get(number)
+
+    def page_at(self, offset: int) -> int:
+        """Página que contém o offset (em caracteres) do texto completo."""
+        return max(bisect_right(self._marks, offset), 1)
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+
+class ExtractionCache:
+    """
+    Cache em disco dos artefatos extraídos de um PDF.
+
+    Os arquivos ficam em um diretório identificado pelo hash do conteúdo do
+    PDF, pela versão do extrator e pela versão do pdfplumber, então qualquer
+    mudança em um deles aponta para um diretório novo.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path], pdf_path: Union[str, Path]):
+        self.cache_dir = Path(cache_dir)
+        self.pdf_path = Path(pdf_path)
+        self._path: Optional[Path] = None
+
+    @property
+    def path(self) -> Path:
+        """Diretório do cache deste PDF."""
+        if self._path is None:
+            key = f"{file_sha256(self.pdf_path)[:32]}-v{EXTRACTOR_VERSION}-pdfplumber{pdfplumber.__version__}"
+            self._path = self.cache_dir / key
+        return self._path
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Gera uma chave curta e estável para as partes informadas."""
+        raw = "\x1f".join(str(part) for part in parts)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+    def load(self, name: str) -> Any:
+        """Lê um artefato do cache. Retorna None se não existir ou estiver corrompido."""
+        try:
+            with open(self.path / f"{name}.json", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def save(self, name: str, data: Any) -> None:
+        """Grava um artefato no cache de forma atômica."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        target = self.path / f"{name}.json"
+        tmp = target.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, target)
+
+
 class PDFExtractor:
-    def __init__(self, pdf_path: str):
+    def __init__(
+        self,
+        pdf_path: str,
+        cache_dir: Optional[Union[str, Path]] = None,
+        workers: int = 1,
+        text_file: Optional[Union[str, Path]] = None
+    ):
         self.pdf_path = Path(pdf_path)
-        self.text = ""
-        self.pages: list[dict] = []
+        self.workers = max(workers, 1)
         self.toc: list[TableOfContentsEntry] = []
         self.sections: dict = {}
+        self._store = PageStore()
+        self._page_count: Optional[int] = None
+        self._toc_key: Optional[str] = None
+        self._cached_blocks: set[int] = set()
+        self.cache = ExtractionCache(cache_dir, self.pdf_path) if cache_dir else None
+
+        # Com o arquivo de texto mapeado, ele faz o papel do cache de páginas:
+        # as páginas em JSON não são carregadas na memória de cada processo
+        if text_file and self.load_text(text_file):
+            return
+
+        # As páginas em si são lidas do cache por blocos, sob demanda
+        if self.cache:
+            self._page_count = self.cache.load("page_count")
+
+    @property
+    def page_count(self) -> int:
+        """Número de páginas do PDF (abre o arquivo só na primeira vez)."""
+        if self._page_count is None:
+            with pdfplumber.open(self.pdf_path) as pdf:
+                self._page_count = len(pdf.pages)
+            if self.cache:
+                self.cache.save("page_count", self._page_count)
+        return self._page_count
+
+    @property
+    def pages(self) -> list[dict]:
+        """Todas as páginas do PDF (extrai as que ainda não foram lidas)."""
+        self._load_pages(1, self.page_count)
+        return [
+            {"number": number, "text": self._store.get(number)}
+            for number in range(1, self.page_count + 1)
+        ]
+
+    @property
+    def text(self) -> str:
+        """Texto completo do PDF, com marcadores de página."""
+        return self.extract()
+
+    def _load_pages(self, start: int, end: int) -> None:
+        """
+        Extrai e memoriza o texto das páginas [start, end] ainda não lidas.
+
+        O PDF só é aberto se houver alguma página faltando no intervalo.
+        """
+        start = max(start, 1)
+        end = min(end, self.page_count)
+        self._restore_pages(start, end)
+
+        missing = [n for n in range(start, end + 1) if n not in self._store]
+        if not missing:
+            return
+
+        if self.workers > 1 and len(missing) > PAGES_PER_TASK:
+            self._store.update(self._extract_pages_parallel(missing))
+        else:
+            self._store.update(_extract_pages(self.pdf_path, missing))
+        self._save_pages(missing)
+
+    def _restore_pages(self, start: int, end: int) -> None:
+        """Lê do cache em disco os blocos de páginas que cobrem [start, end]."""
+        if not self.cache or self._store.is_compact:
+            return
+        first = (start - 1) // PAGES_PER_CACHE_FILE
+        last = (end - 1) // PAGES_PER_CACHE_FILE
+        for block in range(first, last + 1):
+            if block in self._cached_blocks:
+                continue
+            self._cached_blocks.add(block)
+            cached = self.cache.load(f"pages_{block}")
+            if cached:
+                self._store.update({
+                    int(n): text for n, text in cached.items() if int(n) not in self._store
+                })
+
+    def _save_pages(self, numbers: list[int]) -> None:
+        """
+        Grava no cache os blocos que contêm as páginas recém-extraídas.
+
+        Cada bloco é um arquivo de PAGES_PER_CACHE_FILE páginas, então ler
+        páginas soltas regrava só o bloco delas, não o livro inteiro.
+        """
+        if not self.cache:
+            return
+        for block in sorted({(n - 1) // PAGES_PER_CACHE_FILE for n in numbers}):
+            first = block * PAGES_PER_CACHE_FILE + 1
+            self.cache.save(f"pages_{block}", {
+                str(n): self._store.get(n)
+                for n in range(first, first + PAGES_PER_CACHE_FILE)
+                if n in self._store
+            })
+
+    def _extract_pages_parallel(self, numbers: list[int]) -> dict[int, str]:
+        """
+        Extrai as páginas em um pool de processos.
+
+        As páginas são divididas em blocos contíguos; cada processo abre o
+        PDF separadamente e o resultado é remontado na ordem das páginas.
+        """
+        chunks = [
+            numbers[i:i + PAGES_PER_TASK]
+            for i in range(0, len(numbers), PAGES_PER_TASK)
+        ]
+        texts = {}
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(chunks))) as pool:
+            for result in pool.map(_extract_pages, [self.pdf_path] * len(chunks), chunks):
+                texts.update(result)
+        return dict(sorted(texts.items()))
+
+    def iter_pages(self, start: int = 1, end: Optional[int] = None) -> Generator[dict, None, None]:
+        """
+        Percorre as páginas em ordem, extraindo cada uma só quando chega a vez dela.
+
+        O PDF é aberto uma única vez para o intervalo; páginas já extraídas
+        vêm da memória ou do cache. Com `workers` > 1, as páginas são
+        extraídas em blocos de PAGES_PER_TASK × workers pelo pool de
+        processos, e cada bloco é entregue assim que fica pronto.
+
+        Yields:
+            Dicionários {"number", "text"}
+        """
+        end = self.page_count if end is None else min(end, self.page_count)
+        block = PAGES_PER_TASK * self.workers
+        pdf = None
+        extracted: list[int] = []
+        try:
+            for number in range(max(start, 1), end + 1):
+                self._restore_pages(number, min(number + block - 1, end))
+                if number not in self._store and self.workers > 1:
+                    missing = [
+                        n for n in range(number, min(number + block, end + 1))
+                        if n not in self._store
+                    ]
+                    self._store.update(self._extract_pages_parallel(missing))
+                    extracted.extend(missing)
+                elif number not in self._store:
+                    if pdf is None:
+                        pdf = pdfplumber.open(self.pdf_path)
+                    page = pdf.pages[number - 1]
+                    self._store.add(number, page.extract_text() or "")
+                    page.close()
+                    extracted.append(number)
+                yield {"number": number, "text": self._store.get(number)}
+        finally:
+            if pdf is not None:
+                pdf.close()
+            self._save_pages(extracted)
+
+    def get_page_text(self, number: int) -> str:
+        """Retorna o texto de uma página (extraindo sob demanda)."""
+        self._load_pages(number, number)
+        return self._store.get(number)
 
     def extract(self) -> str:
         """Extrai todo o texto do PDF."""
+        if not self._store.is_compact:
+            self._load_pages(1, self.page_count)
+            self._store.compact(self.page_count)
+
+        return self._store.text
+
+    def save_text(self, path: Union[str, Path]) -> None:
+        """
+        Grava o texto extraído em um arquivo UTF-8 com índice de offsets.
+
+        O arquivo pode ser reaberto com `load_text` em outras execuções ou
+        processos sem passar pelo pdfplumber.
+        """
+        self.extract()
+        self._store.save(path, source_sha256=file_sha256(self.pdf_path))
+
+    def load_text(self, path: Union[str, Path]) -> bool:
+        """
+        Passa a ler as páginas de um arquivo gravado por `save_text` via mmap.
+
+        Returns:
+            False se o arquivo não existir ou tiver sido gerado de outro PDF
+        """
+        source_sha256 = file_sha256(self.pdf_path) if self.pdf_path.exists() else None
+        if not MappedPageStore.is_valid(path, source_sha256):
+            return False
+
+        self._store = MappedPageStore(path)
+        self._page_count = len(self._store)
+        return True
+
+    @property
+    def is_mapped(self) -> bool:
+        """Se as páginas vêm de um arquivo de texto mapeado (ver `load_text`)."""
+        return isinstance(self._store, MappedPageStore)
+
+    def page_at(self, offset: int) -> int:
+        """Retorna o número da página que contém um offset de `text`."""
+        if not self._store.is_compact:
+            self.extract()
+        return self._store.page_at(offset)
+
+    def extract_outline(self) -> list[TableOfContentsEntry]:
+        """
+        Lê o índice a partir dos marcadores (outline) do PDF.
+
+        Não extrai texto de nenhuma página: os títulos, níveis e destinos vêm
+        direto do catálogo do documento.
+
+        Returns:
+            Lista de entradas do índice (vazia se o PDF não tiver outline)
+        """
+        if self.cache:
+            cached = self.cache.load("toc_outline")
+            if cached is not None:
+                return [TableOfContentsEntry(**entry) for entry in cached]
+
+        entries = []
         with pdfplumber.open(self.pdf_path) as pdf:
-            for i, page in enumerate(pdf.pages):
-                page_text = page.extract_text() or ""
-                self.pages.append({
-                    "number": i + 1,
-                    "text": page_text
-                })
-                self.text += f"\n--- PÁGINA {i + 1} ---\n{page_text}"
+            doc = pdf.doc
+            self._page_count = len(pdf.pages)
+            page_numbers = {
+                page.pageid: number
+                for number, page in enumerate(PDFPage.create_pages(doc), start=1)
+            }
 
-        return self.text
+            try:
+                outlines = list(doc.get_outlines())
+            except PDFNoOutlines:
+                outlines = []
+
+            for level, title, dest, action, _ in outlines:
+                page = self._resolve_outline_page(doc, dest, action, page_numbers)
+                if page is None or not title:
+                    continue
+                entries.append(TableOfContentsEntry(
+                    title=str(title).strip(),
+                    page=page,
+                    level=level - 1
+                ))
+
+        if self.cache:
+            self.cache.save("toc_outline", [asdict(entry) for entry in entries])
+        return entries
 
-    def extract_table_of_contents(self, toc_start_page: int = 3, toc_end_page: int = 6) -> list[TableOfContentsEntry]:
+    @staticmethod
+    def _resolve_outline_page(doc, dest, action, page_numbers: dict[int, int]) -> Optional[int]:
+        """Resolve o destino de um item do outline para o número da página."""
+        if dest is None and action is not None:
+            action = resolve1(action)
+            if isinstance(action, dict):
+                dest = action.get("D")
+
+        dest = resolve1(dest)
+        if isinstance(dest, (str, bytes, PSLiteral)):
+            name = dest.name if isinstance(dest, PSLiteral) else dest
+            try:
+                dest = resolve1(doc.get_dest(name))
+            except Exception:
+                return None
+        if isinstance(dest, dict):
+            dest = resolve1(dest.get("D"))
+
+        if isinstance(dest, list) and dest and isinstance(dest[0], PDFObjRef):
+            return page_numbers.get(dest[0].objid)
+        return None
+
+    def extract_table_of_contents(
+        self,
+        toc_start_page: int = 3,
+        toc_end_page: int = 6,
+        use_outline: bool = True
+    ) -> list[TableOfContentsEntry]:
         """
         Extrai o índice do PDF.
 
+        Usa o outline do PDF quando existir; caso contrário, lê as páginas do
+        índice e interpreta as linhas "Título ... página".
+
         Args:
-            toc_start_page: Página inicial do índice
-            toc_end_page: Página final do índice
+            toc_start_page: Página inicial do índice (só para o texto)
+            toc_end_page: Página final do índice (só para o texto)
+            use_outline: Se False, ignora o outline e usa sempre o texto
 
         Returns:
             Lista de entradas do índice
         """
-        if not self.pages:
-            self.extract()
+        if use_outline:
+            entries = self.extract_outline()
+            if entries:
+                self._toc_key = "toc_outline"
+                self.toc = entries
+                return entries
+
+        self._toc_key = f"toc_{toc_start_page}_{toc_end_page}"
+        if self.cache:
+            cached = self.cache.load(self._toc_key)
+            if cached is not None:
+                self.toc = [TableOfContentsEntry(**entry) for entry in cached]
+                return self.toc
 
         toc_text = self.get_pages_range(toc_start_page, toc_end_page)
 
@@ -84,6 +668,8 @@ class PDFExtractor:
                 entries.append(TableOfContentsEntry(title=title, page=page, level=level))
 
         self.toc = entries
+        if self.cache:
+            self.cache.save(self._toc_key, [asdict(entry) for entry in entries])
         return entries
 
     def build_sections_from_toc(self) -> dict:
@@ -96,6 +682,13 @@ class PDFExtractor:
         if not self.toc:
             self.extract_table_of_contents()
 
+        sections_key = f"sections_{self._toc_key}"
+        if self.cache and self._toc_key:
+            cached = self.cache.load(sections_key)
+            if cached is not None:
+                self.sections = cached
+                return cached
+
         sections = {}
         for i, entry in enumerate(self.toc):
             # Criar slug a partir do título
@@ -105,7 +698,7 @@ class PDFExtractor:
             if i + 1 < len(self.toc):
                 end_page = self.toc[i + 1].page - 1
             else:
-                end_page = len(self.pages)
+                end_page = self.page_count
 
             sections[slug] = {
                 "title": entry.title,
@@ -115,6 +708,8 @@ class PDFExtractor:
             }
 
         self.sections = sections
+        if self.cache and self._toc_key:
+            self.cache.save(sections_key, sections)
         return sections
 
     def _slugify(self, text: str) -> str:
@@ -138,14 +733,16 @@ class PDFExtractor:
         return text
 
     def get_pages_range(self, start: int, end: int) -> str:
-        """Retorna o texto de um intervalo de páginas."""
+        """Retorna o texto de um intervalo de páginas (extraindo só as necessárias)."""
+        self._load_pages(start, end)
         return "\n".join(
-            p["text"] for p in self.pages
-            if start <= p["number"] <= end
+            self._store.get(number)
+            for number in range(start, end + 1)
+            if number in self._store
         )
 
-    def get_section_text(self, section_slug: str) -> str:
-        """Retorna o texto de uma seção específica."""
+    def resolve_section(self, section_slug: str) -> tuple[str, dict]:
+        """Resolve um slug (exato ou parcial) para a seção correspondente."""
         if not self.sections:
             self.build_sections_from_toc()
 
@@ -157,9 +754,87 @@ class PDFExtractor:
             else:
                 raise ValueError(f"Seção não encontrada: {section_slug}")
 
-        section = self.sections[section_slug]
+        return section_slug, self.sections[section_slug]
+
+    def get_section_text(self, section_slug: str) -> str:
+        """Retorna o texto de uma seção específica."""
+        _, section = self.resolve_section(section_slug)
         return self.get_pages_range(section["start_page"], section["end_page"])
 
+    def get_section_entities(self, section_slug: str, header_pattern: str) -> list[dict]:
+        """
+        Divide uma seção em entidades usando o padrão de cabeçalho.
+
+        O resultado é guardado no cache por (seção, páginas, padrão), então
+        alterar o padrão em ENTITY_PATTERNS gera uma nova divisão.
+        """
+        slug, section = self.resolve_section(section_slug)
+        key = None
+        if self.cache:
+            key = "split_" + ExtractionCache.make_key(
+                slug, section["start_page"], section["end_page"], header_pattern
+            )
+            cached = self.cache.load(key)
+            if cached is not None:
+                return cached
+
+        text = self.get_pages_range(section["start_page"], section["end_page"])
+        entities = list(self.split_by_headers(text, header_pattern))
+        if self.cache:
+            self.cache.save(key, entities)
+        return entities
+
+    def iter_entities(self, section_slug: str, header_pattern: str) -> Generator[dict, None, None]:
+        """
+        Divide uma seção em entidades à medida que as páginas são extraídas.
+
+        Cada entidade é emitida assim que o cabeçalho da seguinte aparece em
+        uma página anterior à última lida, então o resultado é o mesmo de
+        `get_section_entities`, mas a primeira entidade sai sem esperar o fim
+        da seção. O texto já emitido é descartado do buffer.
+        """
+        slug, section = self.resolve_section(section_slug)
+        key = None
+        if self.cache:
+            key = "split_" + ExtractionCache.make_key(
+                slug, section["start_page"], section["end_page"], header_pattern
+            )
+            cached = self.cache.load(key)
+            if cached is not None:
+                yield from cached
+                return
+
+        regex = re.compile(header_pattern, re.MULTILINE)
+        entities = []
+        buffer = ""
+        pages_read = 0
+
+        for page in self.iter_pages(section["start_page"], section["end_page"]):
+            # Só cabeçalhos anteriores à última página lida estão garantidos
+            stable_end = len(buffer)
+            buffer = buffer + "\n" + page["text"] if pages_read else page["text"]
+            pages_read += 1
+
+            matches = list(regex.finditer(buffer))
+            ready = 0
+            for i in range(len(matches) - 1):
+                if matches[i + 1].start() >= stable_end:
+                    break
+                entity = _make_entity(matches[i], buffer[matches[i].start():matches[i + 1].start()])
+                entities.append(entity)
+                yield entity
+                ready = i + 1
+
+            if ready:
+                buffer = buffer[matches[ready].start():]
+
+        for entity in self.split_by_headers(buffer, header_pattern):
+            entities.append(entity)
+            yield entity
+
+        if self.cache:
+            self.cache.save(key, entities)
+
     def list_sections(self) -> list[str]:
         """Lista todas as seções disponíveis."""
         if not self.sections:
@@ -167,20 +842,36 @@ class PDFExtractor:
         return list(self.sections.keys())
 
     def find_section(self, start_pattern: str, end_pattern: str = None) -> str:
-        """Encontra uma seção do texto baseado em padrões."""
-        start_match = re.search(start_pattern, self.text, re.IGNORECASE)
-        if not start_match:
-            return ""
+        """
+        Encontra uma seção do texto baseado em padrões.
 
-        start_idx = start_match.start()
+        Procura página a página (cada uma com o seu marcador, como no texto
+        completo), então só as páginas da seção ficam na memória: o livro
+        não é montado nem decodificado inteiro a partir do arquivo mapeado.
+        Os padrões não atravessam a divisa entre páginas.
+        """
+        start_regex = re.compile(start_pattern, re.IGNORECASE)
+        end_regex = re.compile(end_pattern, re.IGNORECASE) if end_pattern else None
+
+        chunks: list[str] = []
+        for page in self.iter_pages():
+            chunk = PageStore.marker(page["number"]) + page["text"]
+            if not chunks:
+                start_match = start_regex.search(chunk)
+                if not start_match:
+                    continue
+                chunk = chunk[start_match.start():]
+                search_from = 1
+            else:
+                search_from = 0
 
-        if end_pattern:
-            end_match = re.search(end_pattern, self.text[start_idx + 1:], re.IGNORECASE)
-            end_idx = start_idx + 1 + end_match.start() if end_match else len(self.text)
-        else:
-            end_idx = len(self.text)
+            end_match = end_regex.search(chunk, search_from) if end_regex else None
+            if end_match:
+                chunks.append(chunk[:end_match.start()])
+                break
+            chunks.append(chunk)
 
-        return self.text[start_idx:end_idx]
+        return "".join(chunks)
 
     def split_by_headers(self, text: str, header_pattern: str) -> Generator[dict, None, None]:
         """Divide o texto por cabeçalhos."""
@@ -190,10 +881,23 @@ class PDFExtractor:
             start = match.start()
             end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
 
-            yield {
-                "header": match.group().strip(),
-                "content": text[start:end].strip()
-            }
+            yield _make_entity(match, text[start:end])
+
+
+def _make_entity(match: re.Match, content: str) -> dict:
+    """
+    Entidade a partir do cabeçalho encontrado.
+
+    "name" é o nome capturado pelo primeiro grupo do padrão, sem o texto que
+    o padrão exige depois dele (ex.: "Abalado" em "Abalado: você...").
+    """
+    header = match.group().strip()
+    name = match.group(1) if match.re.groups else None
+    return {
+        "header": header,
+        "name": (name or header.split("\n")[0]).strip(),
+        "content": content.strip()
+    }
 
 
 # Padrões de cabeçalho por tipo de entidade
@@ -340,25 +1044,44 @@ SECTION_TO_ENTITY_TYPE = {
 }
 
 
-def extract_entities(pdf_path: str, section_name: str, entity_type: str = None) -> list[dict]:
+def open_extractor(
+    pdf_path: str,
+    cache_dir: Optional[Union[str, Path]] = DEFAULT_CACHE_DIR,
+    workers: int = 1,
+    text_file: Optional[Union[str, Path]] = None,
+    toc_start: int = 3,
+    toc_end: int = 6,
+    use_outline: bool = True
+) -> PDFExtractor:
     """
-    Extrai entidades de uma seção específica do PDF.
+    Cria um PDFExtractor com o índice e as seções já carregados.
 
     Args:
         pdf_path: Caminho para o PDF
-        section_name: Nome/slug da seção (do índice)
-        entity_type: Tipo de entidade para usar padrão correto (opcional).
-                     Se não especificado, tenta inferir pelo nome da seção.
-
-    Returns:
-        Lista de dicionários com header e content de cada entidade
+        cache_dir: Diretório do cache de artefatos (None desativa o cache)
+        workers: Processos usados na extração das páginas
+        text_file: Arquivo de texto mapeado (ver `PDFExtractor.save_text`).
+                   Se não existir ou estiver desatualizado, o livro inteiro é
+                   extraído e o arquivo é gravado para as próximas execuções.
+        toc_start: Página inicial do índice (só para o texto)
+        toc_end: Página final do índice (só para o texto)
+        use_outline: Usa o outline do PDF quando existir (senão, só o texto)
     """
-    extractor = PDFExtractor(pdf_path)
-    extractor.extract()
+    extractor = PDFExtractor(pdf_path, cache_dir=cache_dir, workers=workers, text_file=text_file)
+    if text_file and not extractor.is_mapped:
+        extractor.save_text(text_file)
+        extractor.load_text(text_file)
+    extractor.extract_table_of_contents(toc_start, toc_end, use_outline=use_outline)
     extractor.build_sections_from_toc()
+    return extractor
 
-    section_text = extractor.get_section_text(section_name)
 
+def get_entity_pattern(section_name: str, entity_type: str = None) -> str:
+    """
+    Retorna o padrão de cabeçalho para o tipo de entidade.
+
+    Se o tipo não for informado, tenta inferi-lo pelo nome da seção.
+    """
     # Tentar inferir tipo de entidade pelo nome da seção
     if not entity_type:
         # Busca no mapeamento
@@ -370,16 +1093,58 @@ def extract_entities(pdf_path: str, section_name: str, entity_type: str = None)
 
     # Usar padrão específico ou genérico
     if entity_type and entity_type in ENTITY_PATTERNS:
-        pattern = ENTITY_PATTERNS[entity_type]
-    else:
-        # Padrão genérico: linha começando com maiúscula seguida de quebra
-        pattern = ENTITY_PATTERNS["generico"]
-
-    entities = list(extractor.split_by_headers(section_text, pattern))
-    return entities
+        return ENTITY_PATTERNS[entity_type]
+
+    # Padrão genérico: linha começando com maiúscula seguida de quebra
+    return ENTITY_PATTERNS["generico"]
+
+
+def extract_entities(
+    pdf_path: str,
+    section_name: str,
+    entity_type: str = None,
+    cache_dir: Optional[Union[str, Path]] = DEFAULT_CACHE_DIR,
+    workers: int = 1,
+    text_file: Optional[Union[str, Path]] = None,
+    toc_start: int = 3,
+    toc_end: int = 6,
+    use_outline: bool = True
+) -> list[dict]:
+    """
+    Extrai entidades de uma seção específica do PDF.
 
+    Args:
+        pdf_path: Caminho para o PDF
+        section_name: Nome/slug da seção (do índice)
+        entity_type: Tipo de entidade para usar padrão correto (opcional).
+                     Se não especificado, tenta inferir pelo nome da seção.
+        cache_dir: Diretório do cache de artefatos (None desativa o cache)
+        workers: Processos usados na extração das páginas
+        text_file: Arquivo de texto mapeado (ver `PDFExtractor.save_text`).
+                   Se não existir ou estiver desatualizado, o livro inteiro é
+                   extraído e o arquivo é gravado para as próximas execuções.
+        toc_start: Página inicial do índice (só para o texto)
+        toc_end: Página final do índice (só para o texto)
+        use_outline: Usa o outline do PDF quando existir (senão, só o texto)
 
-def list_available_sections(pdf_path: str, toc_start: int = 3, toc_end: int = 6) -> dict:
+    Returns:
+        Lista de dicionários com header e content de cada entidade
+    """
+    extractor = open_extractor(
+        pdf_path, cache_dir=cache_dir, workers=workers, text_file=text_file,
+        toc_start=toc_start, toc_end=toc_end, use_outline=use_outline
+    )
+    pattern = get_entity_pattern(section_name, entity_type)
+    return extractor.get_section_entities(section_name, pattern)
+
+
+def list_available_sections(
+    pdf_path: str,
+    toc_start: int = 3,
+    toc_end: int = 6,
+    cache_dir: Optional[Union[str, Path]] = DEFAULT_CACHE_DIR,
+    use_outline: bool = True
+) -> dict:
     """
     Lista todas as seções disponíveis no PDF.
 
@@ -387,48 +1152,53 @@ def list_available_sections(pdf_path: str, toc_start: int = 3, toc_end: int = 6)
         pdf_path: Caminho para o PDF
         toc_start: Página inicial do índice
         toc_end: Página final do índice
+        cache_dir: Diretório do cache de artefatos (None desativa o cache)
+        use_outline: Usa o outline do PDF quando existir (senão, só o texto)
 
     Returns:
         Dicionário com seções e suas informações
     """
-    extractor = PDFExtractor(pdf_path)
-    extractor.extract()
-    extractor.extract_table_of_contents(toc_start, toc_end)
+    extractor = PDFExtractor(pdf_path, cache_dir=cache_dir)
+    extractor.extract_table_of_contents(toc_start, toc_end, use_outline=use_outline)
     return extractor.build_sections_from_toc()
 
 
 if __name__ == "__main__":
     import sys
 
-    if len(sys.argv) < 2:
+    # --no-outline pode vir em qualquer posição
+    use_outline = "--no-outline" not in sys.argv
+    argv = [arg for arg in sys.argv if arg != "--no-outline"]
+
+    if len(argv) < 2:
         print("Uso:")
-        print("  python pdf_extractor.py <caminho_pdf> --list-sections")
-        print("  python pdf_extractor.py <caminho_pdf> <secao> [tipo_entidade]")
+        print("  python pdf_extractor.py <caminho_pdf> --list-sections [toc_inicio toc_fim] [--no-outline]")
+        print("  python pdf_extractor.py <caminho_pdf> <secao> [tipo_entidade] [--no-outline]")
         print(f"\nTipos de entidade disponíveis: {list(ENTITY_PATTERNS.keys())}")
         sys.exit(1)
 
-    pdf_path = sys.argv[1]
+    pdf_path = argv[1]
 
-    if len(sys.argv) >= 3 and sys.argv[2] == "--list-sections":
+    if len(argv) >= 3 and argv[2] == "--list-sections":
         # Listar seções
-        toc_start = int(sys.argv[3]) if len(sys.argv) > 3 else 3
-        toc_end = int(sys.argv[4]) if len(sys.argv) > 4 else 6
+        toc_start = int(argv[3]) if len(argv) > 3 else 3
+        toc_end = int(argv[4]) if len(argv) > 4 else 6
 
-        sections = list_available_sections(pdf_path, toc_start, toc_end)
+        sections = list_available_sections(pdf_path, toc_start, toc_end, use_outline=use_outline)
         print("\nSeções encontradas no índice:")
         print("=" * 60)
         for slug, info in sections.items():
             print(f"{slug}: páginas {info['start_page']}-{info['end_page']} ({info['title']})")
         sys.exit(0)
 
-    if len(sys.argv) < 3:
+    if len(argv) < 3:
         print("Erro: especifique a seção ou use --list-sections")
         sys.exit(1)
 
-    section = sys.argv[2]
-    entity_type = sys.argv[3] if len(sys.argv) > 3 else None
+    section = argv[2]
+    entity_type = argv[3] if len(argv) > 3 else None
 
-    entities = extract_entities(pdf_path, section, entity_type)
+    entities = extract_entities(pdf_path, section, entity_type, use_outline=use_outline)
 
     print(f"\nEncontradas {len(entities)} entidades na seção '{section}':")
     print("=" * 60)
@@ -10,51 +10,445 @@ Exemplo:
 
 import argparse
 import json
+import queue
+import random
 import re
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional
+from typing import Generator, Iterable, Optional, Union
 
 import requests
+from jsonschema import Draft7Validator
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 
-from pdf_extractor import PDFExtractor, extract_entities, list_available_sections, ENTITY_PATTERNS
-from prompts import get_prompt, PROMPTS
+from pdf_extractor import (
+    DEFAULT_CACHE_DIR,
+    get_entity_pattern,
+    list_available_sections,
+    open_extractor,
+)
+from chunking import content_budget, estimate_tokens, merge_parts, split_content
+from coalescing import RequestCoalescer
+from generation_limits import DEFAULT_STATS_PATH, MIN_SAMPLES, GenerationLimits
+from journal import RunJournal
+from prompts import get_batch_prompt, get_repair_prompt, get_schema, split_prompt, PROMPT_FALLBACKS, PROMPTS
+from response_cache import DEFAULT_RESPONSE_CACHE, ResponseCache
 
 
 # Configuração do Ollama
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_URL = "http://localhost:11434"
 DEFAULT_MODEL = "mistral"
 
+# Conexões mantidas abertas por cliente
+DEFAULT_POOL_SIZE = 10
+
+# Máximo de tokens na resposta
+DEFAULT_NUM_PREDICT = 4096
+
+# Tamanho do contexto pedido ao modelo (prompt + resposta)
+DEFAULT_NUM_CTX = 8192
+
+# Timeout padrão de uma requisição de geração (segundos)
+DEFAULT_TIMEOUT = 120.0
+
+# Espera entre tentativas após falhas de transporte (segundos, dobra a cada tentativa)
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+# Tempo que o Ollama mantém o modelo (e o cache do prompt) carregado entre requisições
+DEFAULT_KEEP_ALIVE = "30m"
+
+# Fecho do prompt que avalia só o prefixo (ver LLMClient.reuse_prefix)
+PREFIX_PRIMER = "(o texto vem na próxima mensagem; por enquanto responda apenas OK)"
+
+# Tamanho máximo das filas entre os estágios do pipeline
+QUEUE_SIZE = 8
+
+# Pool de servidores: falhas seguidas até afastar um servidor e por quanto tempo (segundos,
+# dobra a cada novo afastamento)
+EJECT_AFTER = 2
+EJECT_SECONDS = 15.0
+EJECT_MAX_SECONDS = 300.0
+
+# Peso da última medida na média móvel de latência de cada servidor
+LATENCY_ALPHA = 0.3
+
+# Entidades maiores que isto (em caracteres) não entram em lotes
+BATCH_MAX_CHARS = 2000
+
+# Segundos por token de conteúdo para tipos sem histórico (só a proporção entre custos importa)
+DEFAULT_SECONDS_PER_TOKEN = 0.02
+
+# Amostragem especulativa: tipos em que as tentativas em sequência costumam se acumular e
+# as temperaturas das K requisições simultâneas (a primeira é a usual)
+SPECULATIVE_TYPES = ("classes", "divindades", "criaturas")
+SPECULATIVE_TEMPERATURES = (0.1, 0.4, 0.7, 1.0)
+
+
+class RequestCancelled(Exception):
+    """Requisição interrompida porque outra amostra especulativa já venceu."""
+
+
+class _BracketScanner:
+    """
+    Profundidade de chaves/colchetes fora de strings (respeitando escapes).
+
+    Começa logo depois do "{" ou "[" de abertura; `step` recebe os
+    caracteres seguintes, um a um, e retorna True no que fecha o valor.
+    """
+
+    def __init__(self):
+        self.depth = 1
+        self.in_string = False
+        self.escape = False
+
+    def step(self, char: str) -> bool:
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif char == "\\":
+                self.escape = True
+            elif char == '"':
+                self.in_string = False
+        elif char == '"':
+            self.in_string = True
+        elif char in "{[":
+            self.depth += 1
+        elif char in "}]":
+            self.depth -= 1
+            return self.depth == 0
+        return False
+
+
+def _span_end(text: str, start: int) -> Optional[int]:
+    """Posição depois do fecho do valor aberto em `start`, ou None se o texto acaba antes."""
+    scanner = _BracketScanner()
+    for pos in range(start + 1, len(text)):
+        if scanner.step(text[pos]):
+            return pos + 1
+    return None
+
+
+class JSONStreamTracker:
+    """
+    Acompanha uma resposta em streaming e detecta quando um valor JSON de
+    nível superior termina.
+
+    Conta a profundidade com um `_BracketScanner` (o mesmo de `_span_end`).
+    Quando ela volta a zero, o trecho passa por `_find_json_value`, a mesma
+    busca usada na extração: a resposta está completa se ele contém um
+    objeto, ou um array de objetos (lotes). Se não (ex.: "{texto}" ou "[1]"
+    na prosa), volta a procurar a partir dali.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.complete = False
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._scanner: Optional[_BracketScanner] = None
+
+    def feed(self, chunk: str) -> bool:
+        """Acrescenta um trecho da resposta. Retorna True se o JSON já fechou."""
+        if self.complete:
+            return True
+
+        self.text += chunk
+        text = self.text
+        while self._pos < len(text):
+            char = text[self._pos]
+            self._pos += 1
+
+            if self._start is None:
+                if char in "{[":
+                    self._start = self._pos - 1
+                    self._scanner = _BracketScanner()
+                continue
+
+            if self._scanner.step(char):
+                value = _find_json_value(text[self._start:self._pos])
+                if isinstance(value, dict) or (
+                    isinstance(value, list) and any(isinstance(item, dict) for item in value)
+                ):
+                    self.complete = True
+                    return True
+                self._start = None
+
+        return False
+
+
+class RunSettings:
+    """
+    Configuração da execução compartilhada pelos clientes.
+
+    Um único objeto é passado ao `LLMClient` (ou ao `LLMClientPool` e a
+    cada um dos seus servidores), de modo que os limites aprendidos, a
+    coalescência e a cascata são os mesmos em qualquer servidor.
+
+    Args:
+        cascade: Modelos do mais barato ao mais caro (padrão: só o modelo do cliente)
+        limits: `GenerationLimits` que ajusta num_predict e timeout por tipo
+        speculative: Requisições simultâneas por entidade nos `speculative_types`
+        speculative_types: Tipos de entidade com amostragem especulativa
+        coalescer: `RequestCoalescer` das entidades repetidas na execução
+    """
+
+    def __init__(
+        self,
+        cascade: Optional[list[str]] = None,
+        limits: Optional[GenerationLimits] = None,
+        speculative: int = 1,
+        speculative_types: Iterable[str] = SPECULATIVE_TYPES,
+        coalescer: Optional[RequestCoalescer] = None
+    ):
+        self.cascade = list(cascade or [])
+        self.limits = limits
+        self.speculative = speculative
+        self.speculative_types = set(speculative_types)
+        self.coalescer = coalescer
+
 
 class LLMClient:
-    """Cliente para comunicação com o Ollama."""
+    """
+    Cliente para comunicação com o Ollama.
+
+    Mantém uma sessão HTTP com pool de conexões keep-alive, compartilhada
+    entre as threads do pipeline. Com um `ResponseCache`, respostas já
+    validadas para o mesmo modelo, prompts e opções não vão ao servidor.
+
+    Com `stream=True`, a resposta é lida em pedaços e a requisição é
+    encerrada assim que o primeiro valor JSON completo chega.
+
+    Com `structured_output=True`, `process_entity` envia o JSON Schema do
+    tipo de entidade no parâmetro "format" do Ollama, restringindo a
+    geração à estrutura esperada.
+
+    Com `reuse_prefix=True`, o prefixo fixo do prompt (instrução e exemplo)
+    é avaliado uma vez por tipo e o estado resultante (`context` do Ollama)
+    é reenviado nas requisições seguintes, que levam só o conteúdo da
+    entidade. Se o servidor não devolver `context` ou recusar a requisição
+    (erro 4xx), o cliente volta a enviar o prompt completo. A geração por
+    esse caminho continua uma conversa diferente (o prefixo e a resposta
+    curta do primer), então as respostas ficam no cache com chave própria.
+
+    As opções da execução ficam em `settings` (ver `RunSettings`):
+
+    Com um `GenerationLimits`, `process_entity` ajusta o `num_predict` e o
+    timeout de cada requisição ao que o tipo de entidade costuma gerar.
+
+    Com `cascade` (modelos do mais barato ao mais caro), `process_entity`
+    tenta cada entidade no primeiro modelo e só passa ao seguinte quando a
+    resposta não vira um JSON válido.
+
+    Com `speculative` > 1, as entidades dos `speculative_types` vão ao
+    modelo em `speculative` requisições simultâneas, com temperaturas e
+    seeds diferentes; a primeira resposta válida vence e as demais são
+    canceladas (ver `_extract_speculative`).
 
-    def __init__(self, model: str = DEFAULT_MODEL, base_url: str = OLLAMA_URL):
+    Com um `RequestCoalescer`, entidades com o mesmo conteúdo e o mesmo
+    tipo de prompt pedidas na mesma execução compartilham uma inferência.
+    """
+
+    def __init__(
+        self,
+        model: str = DEFAULT_MODEL,
+        base_url: str = OLLAMA_URL,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        cache: Optional[ResponseCache] = None,
+        stream: bool = False,
+        structured_output: bool = False,
+        reuse_prefix: bool = False,
+        keep_alive: str = DEFAULT_KEEP_ALIVE,
+        num_ctx: int = DEFAULT_NUM_CTX,
+        settings: Optional[RunSettings] = None
+    ):
         self.model = model
-        self.base_url = base_url
+        self.settings = settings or RunSettings()
+        self.models = self.settings.cascade or [model]
+        self.cache = cache
+        self.stream = stream
+        self.structured_output = structured_output
+        self.reuse_prefix = reuse_prefix
+        self.keep_alive = keep_alive
+        self.num_ctx = num_ctx
+        self._local = threading.local()
+        self._prefix_contexts: dict[tuple[str, str, str], list[int]] = {}
+        self._prefix_lock = threading.Lock()
+        # Aceita também a URL antiga, apontando direto para /api/generate
+        self.base_url = base_url.rstrip("/").removesuffix("/api/generate")
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _url(self, endpoint: str) -> str:
+        return f"{self.base_url}/api/{endpoint}"
+
+    def close(self) -> None:
+        """Fecha as conexões do pool e o cache de respostas e grava os limites aprendidos."""
+        self.session.close()
+        if self.cache:
+            self.cache.close()
+        if self.settings.limits:
+            self.settings.limits.save()
+
+    def __enter__(self) -> "LLMClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def last_metrics(self) -> dict:
+        """
+        Métricas da última chamada a `generate` feita nesta thread.
+
+        Chaves: cached, ttft (segundos até o primeiro token, só em streaming),
+        duration, eval_count, eval_duration, prompt_eval_count, early_stop,
+        prefix_reused e model.
+        """
+        return getattr(self._local, "metrics", {})
+
+    @last_metrics.setter
+    def last_metrics(self, metrics: dict) -> None:
+        self._local.metrics = metrics
 
     def check_connection(self) -> bool:
         """Verifica se o Ollama está rodando."""
         try:
-            response = requests.get("http://localhost:11434/api/tags", timeout=5)
+            response = self.session.get(self._url("tags"), timeout=5)
             return response.status_code == 200
-        except requests.exceptions.ConnectionError:
+        except requests.exceptions.RequestException:
             return False
 
     def list_models(self) -> list[str]:
         """Lista modelos disponíveis."""
         try:
-            response = requests.get("http://localhost:11434/api/tags", timeout=5)
+            response = self.session.get(self._url("tags"), timeout=5)
             if response.status_code == 200:
                 data = response.json()
                 return [m["name"] for m in data.get("models", [])]
-        except:
+        except (requests.exceptions.RequestException, ValueError):
             pass
         return []
 
-    def generate(self, system_prompt: str, user_prompt: str, temperature: float = 0.1) -> str:
+    def _cache_key(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float,
+        schema: Optional[dict],
+        model: str,
+        prefix_reused: bool = False
+    ) -> str:
+        # num_predict fica fora da chave: só respostas completas e válidas são guardadas
+        options = {"temperature": temperature, "format": schema}
+        if prefix_reused:
+            # Gerada a partir do contexto do primer, não do prompt completo
+            options["prefix_context"] = PREFIX_PRIMER
+        return ResponseCache.make_key(model, system_prompt, user_prompt, **options)
+
+    def _reuses_prefix(self, user_prompt: str, prefix: Optional[str]) -> bool:
+        """Se a requisição vai pelo caminho do prefixo reaproveitado."""
+        return bool(self.reuse_prefix and prefix and user_prompt.startswith(prefix))
+
+    def remember(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        response: str,
+        temperature: float = 0.1,
+        schema: Optional[dict] = None,
+        model: Optional[str] = None,
+        prefix_reused: bool = False
+    ) -> None:
+        """
+        Guarda no cache uma resposta que passou na validação.
+
+        `prefix_reused` vem das métricas da geração (ver `last_metrics`).
+        """
+        if self.cache:
+            model = model or self.model
+            key = self._cache_key(system_prompt, user_prompt, temperature, schema, model, prefix_reused)
+            self.cache.put(key, model, response)
+
+    def lookup(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float = 0.1,
+        schema: Optional[dict] = None,
+        model: Optional[str] = None,
+        prefix: Optional[str] = None
+    ) -> Optional[str]:
+        """Resposta guardada no cache para os prompts (e o caminho de `prefix`), ou None."""
+        if not self.cache:
+            return None
+        return self.cache.get(self._cache_key(
+            system_prompt, user_prompt, temperature, schema, model or self.model,
+            self._reuses_prefix(user_prompt, prefix)
+        ))
+
+    def _prefix_context(self, system_prompt: str, prefix: str, model: str) -> Optional[list[int]]:
+        """
+        Estado do modelo após avaliar o system prompt e o prefixo.
+
+        A primeira chamada para um prefixo faz uma requisição curta que só
+        avalia o prefixo; as seguintes reaproveitam o `context` devolvido.
+        Desativa `reuse_prefix` se o servidor responder sem o contexto ou
+        recusar a requisição (4xx); falhas passageiras (conexão, 5xx) só
+        fazem esta requisição ir com o prompt completo.
+        """
+        key = (model, system_prompt, prefix)
+        with self._prefix_lock:
+            if key in self._prefix_contexts:
+                return self._prefix_contexts[key]
+
+        payload = {
+            "model": model,
+            "prompt": prefix + PREFIX_PRIMER,
+            "system": system_prompt,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": {"temperature": 0, "num_predict": 1, "num_ctx": self.num_ctx},
+        }
+        try:
+            response = self.session.post(self._url("generate"), json=payload, timeout=DEFAULT_TIMEOUT)
+            if _rejected(response):
+                self.reuse_prefix = False
+                return None
+            response.raise_for_status()
+            context = response.json().get("context")
+        except (requests.exceptions.RequestException, ValueError):
+            return None
+
+        if not context:
+            self.reuse_prefix = False
+            return None
+
+        with self._prefix_lock:
+            # Outra thread pode ter avaliado o mesmo prefixo enquanto isso
+            return self._prefix_contexts.setdefault(key, context)
+
+    def generate(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float = 0.1,
+        num_predict: int = DEFAULT_NUM_PREDICT,
+        use_cache: bool = True,
+        schema: Optional[dict] = None,
+        prefix: Optional[str] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        model: Optional[str] = None,
+        seed: Optional[int] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> str:
         """
         Gera resposta do modelo.
 
@@ -62,37 +456,449 @@ class LLMClient:
             system_prompt: Prompt de sistema
             user_prompt: Prompt do usuário
             temperature: Temperatura (menor = mais determinístico)
+            num_predict: Máximo de tokens na resposta
+            use_cache: Se False, ignora respostas guardadas no cache
+            schema: JSON Schema enviado como "format" para restringir a geração
+            prefix: Início fixo de `user_prompt`, reaproveitado com `reuse_prefix`
+            timeout: Tempo máximo da requisição em segundos
+            model: Modelo da requisição (padrão: `self.model`)
+            seed: Seed da amostragem do Ollama
+            cancel: Evento que interrompe a requisição; com ele a resposta é lida
+                em streaming, e a conexão é fechada assim que o evento é sinalizado
 
         Returns:
             Resposta do modelo
+
+        Raises:
+            RequestCancelled: Se `cancel` foi sinalizado antes do fim da resposta
         """
+        model = model or self.model
+        reuse = self._reuses_prefix(user_prompt, prefix)
+        self._local.metrics = {}
+        if self.cache and use_cache:
+            cached = self.cache.get(
+                self._cache_key(system_prompt, user_prompt, temperature, schema, model, reuse)
+            )
+            if cached is not None:
+                self._local.metrics = {"cached": True, "model": model, "prefix_reused": reuse}
+                return cached
+
         payload = {
-            "model": self.model,
+            "model": model,
             "prompt": user_prompt,
             "system": system_prompt,
-            "stream": False,
+            "stream": self.stream or cancel is not None,
+            "keep_alive": self.keep_alive,
             "options": {
                 "temperature": temperature,
-                "num_predict": 4096,  # Máximo de tokens na resposta
+                "num_predict": num_predict,
+                "num_ctx": self.num_ctx,
             }
         }
+        if schema:
+            payload["format"] = schema
+        if seed is not None:
+            payload["options"]["seed"] = seed
+
+        context = self._prefix_context(system_prompt, prefix, model) if reuse else None
 
+        started = time.perf_counter()
         try:
-            response = requests.post(self.base_url, json=payload, timeout=120)
-            response.raise_for_status()
-            data = response.json()
-            return data.get("response", "")
+            if context:
+                # O system prompt já está no contexto
+                continuation = {key: value for key, value in payload.items() if key != "system"}
+                continuation.update(prompt=user_prompt[len(prefix):], context=context)
+                try:
+                    text, data, ttft = self._post_generate(continuation, timeout, cancel)
+                except requests.exceptions.HTTPError as e:
+                    # Volta ao prompt completo; só uma recusa (4xx) desativa o reaproveitamento
+                    if _rejected(e.response):
+                        self.reuse_prefix = False
+                    context = None
+            if not context:
+                text, data, ttft = self._post_generate(payload, timeout, cancel)
         except requests.exceptions.Timeout:
             raise TimeoutError("Timeout ao gerar resposta do modelo")
         except requests.exceptions.RequestException as e:
             raise ConnectionError(f"Erro de conexão com Ollama: {e}")
 
+        self._local.metrics = {
+            "cached": False,
+            "ttft": ttft,
+            "duration": time.perf_counter() - started,
+            "eval_count": data.get("eval_count"),
+            "eval_duration": data.get("eval_duration"),
+            "prompt_eval_count": data.get("prompt_eval_count"),
+            "early_stop": not data.get("done", True),
+            "prefix_reused": bool(context),
+            "model": model,
+        }
+        return text
+
+    def _post_generate(
+        self,
+        payload: dict,
+        timeout: float,
+        cancel: Optional[threading.Event] = None
+    ) -> tuple[str, dict, Optional[float]]:
+        """Envia a requisição de geração e retorna (texto, dados finais, TTFT)."""
+        if payload["stream"]:
+            return self._generate_stream(payload, timeout, cancel)
+
+        response = self.session.post(self._url("generate"), json=payload, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+        return data.get("response", ""), data, None
+
+    def _generate_stream(
+        self,
+        payload: dict,
+        timeout: float,
+        cancel: Optional[threading.Event] = None
+    ) -> tuple[str, dict, Optional[float]]:
+        """
+        Lê a resposta NDJSON pedaço a pedaço e fecha a conexão assim que o
+        JSON de nível superior termina ou `cancel` é sinalizado.
 
-def extract_json_from_response(response: str) -> Optional[dict]:
+        Returns:
+            Tupla (texto, último pedaço recebido, tempo até o primeiro token)
+        """
+        tracker = JSONStreamTracker()
+        started = time.perf_counter()
+        ttft = None
+        chunks = 0
+        data = {}
+
+        if cancel is not None and cancel.is_set():
+            raise RequestCancelled("Requisição cancelada")
+        with self.session.post(self._url("generate"), json=payload, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if cancel is not None and cancel.is_set():
+                    # Fechar a conexão faz o Ollama parar de gerar
+                    raise RequestCancelled("Requisição cancelada")
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise requests.exceptions.RequestException(data["error"])
+
+                token = data.get("response", "")
+                if token:
+                    chunks += 1
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                if tracker.feed(token) or data.get("done"):
+                    break
+
+        if not data.get("done"):
+            # Interrompido antes do fim: cada pedaço do Ollama é um token
+            data = {"done": False, "eval_count": chunks}
+        return tracker.text, data, ttft
+
+
+def _rejected(response: Optional[requests.Response]) -> bool:
+    """Se o servidor recusou a requisição (erro 4xx), em vez de falhar ao atendê-la."""
+    return response is not None and 400 <= response.status_code < 500
+
+
+class _Backend:
+    """Estado de um servidor do `LLMClientPool`."""
+
+    def __init__(self, client: LLMClient):
+        self.client = client
+        self.url = client.base_url
+        self.inflight = 0
+        self.latency: Optional[float] = None
+        self.failures = 0
+        self.probation = False
+        self.ejected_until = 0.0
+        self.cooldown = EJECT_SECONDS
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+        self.eval_count = 0
+        self.busy = 0.0
+
+
+class LLMClientPool:
+    """
+    Conjunto de servidores Ollama usado como um único `LLMClient`.
+
+    Cada chamada a `generate` vai para o servidor saudável com menor custo
+    estimado: (requisições em andamento + 1) × média móvel da latência.
+    Falhas de transporte levam a requisição para outro servidor; depois de
+    EJECT_AFTER falhas seguidas o servidor é afastado por um tempo que dobra
+    a cada novo afastamento. Passado o prazo, ele volta em observação: um
+    sucesso o readmite, uma falha o afasta de novo.
+
+    Os servidores compartilham o cache de respostas e as `RunSettings`.
+    Os demais argumentos (`client_options`) são os do `LLMClient` criado
+    para cada servidor.
+    """
+
+    def __init__(
+        self,
+        base_urls: list[str],
+        settings: Optional[RunSettings] = None,
+        **client_options
+    ):
+        self.settings = settings or RunSettings()
+        self.backends = [
+            _Backend(LLMClient(base_url=url, settings=self.settings, **client_options))
+            for url in base_urls
+        ]
+        first = self.backends[0].client
+        self.model = first.model
+        self.models = first.models
+        self.cache = first.cache
+        self.stream = first.stream
+        self.structured_output = first.structured_output
+        self.num_ctx = first.num_ctx
+        self.base_url = ", ".join(backend.url for backend in self.backends)
+        self.started = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        """Fecha as conexões de todos os servidores, o cache e grava os limites aprendidos."""
+        for backend in self.backends:
+            backend.client.session.close()
+        if self.cache:
+            self.cache.close()
+        if self.settings.limits:
+            self.settings.limits.save()
+
+    def __enter__(self) -> "LLMClientPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def last_metrics(self) -> dict:
+        """Métricas da última chamada nesta thread, com o servidor usado em "backend"."""
+        return getattr(self._local, "metrics", {})
+
+    @last_metrics.setter
+    def last_metrics(self, metrics: dict) -> None:
+        self._local.metrics = metrics
+
+    def check_connection(self) -> bool:
+        """Verifica os servidores, afasta os que não respondem e diz se algum está disponível."""
+        available = False
+        for backend in self.backends:
+            if backend.client.check_connection():
+                available = True
+            else:
+                with self._lock:
+                    self._eject(backend)
+        return available
+
+    def list_models(self) -> list[str]:
+        """Modelos disponíveis em pelo menos um servidor."""
+        return sorted({m for backend in self.backends for m in backend.client.list_models()})
+
+    def remember(self, *args, **kwargs) -> None:
+        """Guarda no cache (compartilhado) uma resposta que passou na validação."""
+        self.backends[0].client.remember(*args, **kwargs)
+
+    def lookup(self, *args, **kwargs) -> Optional[str]:
+        """Resposta guardada no cache (compartilhado) para os prompts."""
+        return self.backends[0].client.lookup(*args, **kwargs)
+
+    def _eject(self, backend: _Backend) -> None:
+        backend.ejected_until = time.monotonic() + backend.cooldown
+        backend.cooldown = min(backend.cooldown * 2, EJECT_MAX_SECONDS)
+        backend.ejections += 1
+        backend.failures = 0
+        backend.probation = True
+
+    def _choose(self, tried: list[_Backend]) -> Optional[_Backend]:
+        """Escolhe o servidor da próxima requisição e conta a requisição em andamento."""
+        with self._lock:
+            now = time.monotonic()
+            remaining = [backend for backend in self.backends if backend not in tried]
+            if not remaining:
+                return None
+
+            candidates = [backend for backend in remaining if backend.ejected_until <= now]
+            if not candidates:
+                # Todos afastados: tenta o que volta primeiro
+                candidates = [min(remaining, key=lambda backend: backend.ejected_until)]
+
+            known = [backend.latency for backend in candidates if backend.latency is not None]
+            default_latency = sum(known) / len(known) if known else 1.0
+            # Nos empates, o servidor com menos requisições (um ainda não medido ganha a vez)
+            chosen = min(
+                candidates,
+                key=lambda backend: (
+                    (backend.inflight + 1) * (backend.latency or default_latency),
+                    backend.inflight,
+                    backend.requests
+                )
+            )
+            chosen.inflight += 1
+            return chosen
+
+    def generate(self, *args, **kwargs) -> str:
+        """
+        Gera a resposta no servidor escolhido por `_choose`.
+
+        Aceita os mesmos argumentos de `LLMClient.generate`. Em falha de
+        transporte, tenta os demais servidores antes de desistir.
+        """
+        self._local.metrics = {}
+        tried: list[_Backend] = []
+        last_error: Exception = ConnectionError("Nenhum servidor Ollama disponível")
+
+        while (backend := self._choose(tried)) is not None:
+            tried.append(backend)
+            started = time.perf_counter()
+            try:
+                text = backend.client.generate(*args, **kwargs)
+            except (TimeoutError, ConnectionError) as e:
+                last_error = e
+                with self._lock:
+                    backend.inflight -= 1
+                    backend.errors += 1
+                    backend.failures += 1
+                    if backend.probation or backend.failures >= EJECT_AFTER:
+                        self._eject(backend)
+                continue
+            except Exception:
+                with self._lock:
+                    backend.inflight -= 1
+                raise
+
+            elapsed = time.perf_counter() - started
+            metrics = backend.client.last_metrics
+            with self._lock:
+                backend.inflight -= 1
+                backend.requests += 1
+                backend.failures = 0
+                if backend.probation:
+                    backend.probation = False
+                    backend.cooldown = EJECT_SECONDS
+                if not metrics.get("cached"):
+                    backend.busy += elapsed
+                    backend.eval_count += metrics.get("eval_count") or 0
+                    backend.latency = elapsed if backend.latency is None else (
+                        LATENCY_ALPHA * elapsed + (1 - LATENCY_ALPHA) * backend.latency
+                    )
+            self._local.metrics = {**metrics, "backend": backend.url}
+            return text
+
+        raise last_error
+
+    def backend_stats(self) -> list[dict]:
+        """Requisições, falhas, latência e vazão de cada servidor."""
+        elapsed = time.perf_counter() - self.started
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "url": backend.url,
+                    "requests": backend.requests,
+                    "errors": backend.errors,
+                    "ejections": backend.ejections,
+                    "healthy": backend.ejected_until <= now,
+                    "latency": backend.latency,
+                    "requests_per_minute": backend.requests * 60 / elapsed if elapsed else 0.0,
+                    "tokens_per_second": backend.eval_count / backend.busy if backend.busy else 0.0,
+                }
+                for backend in self.backends
+            ]
+
+
+def print_backend_report(client) -> None:
+    """Vazão por servidor, quando o cliente é um `LLMClientPool`."""
+    if not isinstance(client, LLMClientPool):
+        return
+
+    print(f"\n{'servidor':<32} {'req':>5} {'falhas':>6} {'afast.':>6} "
+          f"{'lat. (s)':>8} {'req/min':>8} {'tok/s':>7}")
+    for backend in client.backend_stats():
+        latency = f"{backend['latency']:.2f}" if backend["latency"] is not None else "-"
+        print(f"{backend['url']:<32} {backend['requests']:>5} {backend['errors']:>6} "
+              f"{backend['ejections']:>6} {latency:>8} {backend['requests_per_minute']:>8.1f} "
+              f"{backend['tokens_per_second']:>7.1f}")
+
+
+def print_cascade_report(client, entity_types: Iterable[str]) -> None:
+    """Acertos de cada modelo da cascata por tipo de entidade (histórico do `GenerationLimits`)."""
+    if len(client.models) < 2 or not client.settings.limits:
+        return
+
+    rows = []
+    for entity_type in entity_types:
+        rates = client.settings.limits.model_hit_rates(entity_type)
+        if any(model in rates for model in client.models):
+            rows.extend((entity_type, model, *rates.get(model, (0, 0))) for model in client.models)
+    if not rows:
+        return
+
+    print(f"\n{'tipo':<18} {'modelo':<24} {'tentativas':>10} {'acertos':>8} {'taxa':>6}")
+    for entity_type, model, attempts, successes in rows:
+        rate = f"{successes / attempts:.0%}" if attempts else "-"
+        print(f"{entity_type:<18} {model:<24} {attempts:>10} {successes:>8} {rate:>6}")
+
+
+_JSON_START = re.compile(r"[{\[]")
+_decoder = json.JSONDecoder()
+
+
+def _find_json_value(text: str, prefer: type = dict) -> Union[dict, list, None]:
+    """
+    Procura um valor JSON em um texto, preferindo o tipo `prefer`.
+
+    Tenta `JSONDecoder.raw_decode` a partir de cada "{" ou "[". O primeiro
+    valor decodificado do tipo preferido é o resultado; um do outro tipo
+    (ex.: "[1]" citado na prosa antes do objeto, ou um objeto comentado
+    depois do array de um lote) só é devolvido se nenhum do tipo preferido
+    vier depois dele, e os valores dentro dele não são candidatos. Um trecho que
+    fecha mas não é JSON válido (ex.: chaves soltas na prosa) é pulado e a
+    busca continua dentro dele. Um trecho que nunca fecha (resposta cortada
+    no `num_predict`) encerra a busca: os objetos internos dele (ex.:
+    `hit_points` de uma criatura) não são a resposta.
+    """
+    fallback = None
+    pos = 0
+    while (match := _JSON_START.search(text, pos)) is not None:
+        try:
+            value, end = _decoder.raw_decode(text, match.start())
+        except json.JSONDecodeError:
+            if _span_end(text, match.start()) is None:
+                break
+            pos = match.start() + 1
+            continue
+        if isinstance(value, prefer):
+            return value
+        if fallback is None:
+            fallback = value
+        pos = end
+
+    return fallback
+
+
+def json_unterminated(text: str) -> bool:
+    """Se algum valor JSON de nível superior do texto abre e não fecha (resposta cortada)."""
+    pos = 0
+    while (match := _JSON_START.search(text, pos)) is not None:
+        end = _span_end(text, match.start())
+        if end is None:
+            return True
+        pos = end
+    return False
+
+
+def extract_json_from_response(response: str, prefer: type = dict) -> Union[dict, list, None]:
     """
     Extrai JSON de uma resposta do modelo.
 
-    Tenta encontrar JSON válido mesmo se houver texto extra.
+    Tenta encontrar JSON válido mesmo se houver texto extra antes ou depois.
+    Em uma resposta com vários valores, fica com o primeiro do tipo `prefer`
+    (`list` para as respostas em lote).
     """
     # Remove markdown code blocks se presentes
     response = re.sub(r'^```json\s*', '', response, flags=re.MULTILINE)
@@ -105,21 +911,8 @@ def extract_json_from_response(response: str) -> Optional[dict]:
     except json.JSONDecodeError:
         pass
 
-    # Tenta encontrar JSON no texto
-    json_patterns = [
-        r'\{[\s\S]*\}',  # Objeto JSON
-        r'\[[\s\S]*\]',  # Array JSON
-    ]
-
-    for pattern in json_patterns:
-        matches = re.findall(pattern, response)
-        for match in matches:
-            try:
-                return json.loads(match)
-            except json.JSONDecodeError:
-                continue
-
-    return None
+    # Procura o primeiro objeto/array JSON válido no texto
+    return _find_json_value(response, prefer)
 
 
 def slugify(text: str) -> str:
@@ -141,114 +934,907 @@ def slugify(text: str) -> str:
     return text
 
 
-def validate_json_structure(data: dict, entity_type: str) -> tuple[bool, list[str]]:
+# Schema mínimo para tipos sem schema próprio
+_BASE_SCHEMA = {"type": "object", "required": ["id", "name"]}
+
+_validators: dict[tuple[str, bool], Draft7Validator] = {}
+
+
+def _get_validator(entity_type: str, partial: bool = False) -> Draft7Validator:
+    key = (entity_type, partial)
+    if key not in _validators:
+        try:
+            schema = get_schema(entity_type, partial)
+        except ValueError:
+            schema = _BASE_SCHEMA
+        _validators[key] = Draft7Validator(schema)
+    return _validators[key]
+
+
+def validate_json_structure(
+    data: dict,
+    entity_type: str,
+    partial: bool = False
+) -> tuple[bool, list[str]]:
     """
-    Valida a estrutura básica do JSON.
+    Valida o JSON contra o schema do tipo de entidade (ver prompts.SCHEMAS).
+
+    Com `partial=True`, valida uma parte de entidade dividida: os tipos dos
+    campos são conferidos, mas só id e name são obrigatórios.
 
     Returns:
         Tupla (é_válido, lista_de_erros)
     """
+    if not isinstance(data, dict):
+        return False, ["Resposta não é um objeto JSON"]
+
+    validator = _get_validator(entity_type, partial)
     errors = []
 
-    # Campos obrigatórios para todos os tipos
-    required_fields = ["id", "name"]
-    for field in required_fields:
+    # Campos obrigatórios do nível superior
+    for field in validator.schema.get("required", []):
         if field not in data:
-            errors.append(f"Campo obrigatório ausente: {field}")
-
-    # Validações específicas por tipo
-    if entity_type == "racas":
-        if "attributes" not in data:
-            errors.append("Campo 'attributes' ausente")
-        if "abilities" not in data:
-            errors.append("Campo 'abilities' ausente")
-
-    elif entity_type == "classes":
-        if "hit_points" not in data:
-            errors.append("Campo 'hit_points' ausente")
-        if "skills" not in data:
-            errors.append("Campo 'skills' ausente")
-
-    elif entity_type == "origens":
-        if "benefits" not in data:
-            errors.append("Campo 'benefits' ausente")
-
-    elif entity_type == "divindades":
-        if "channel_energy" not in data:
-            errors.append("Campo 'channel_energy' ausente")
-        if "granted_powers" not in data:
-            errors.append("Campo 'granted_powers' ausente")
-
-    elif entity_type == "pericias":
-        if "key_attribute" not in data:
-            errors.append("Campo 'key_attribute' ausente")
-        if "uses" not in data:
-            errors.append("Campo 'uses' ausente")
-
-    elif entity_type == "magias":
-        if "type" not in data:
-            errors.append("Campo 'type' ausente")
-        if "circle" not in data:
-            errors.append("Campo 'circle' ausente")
+            if field in ("id", "name"):
+                errors.append(f"Campo obrigatório ausente: {field}")
+            else:
+                errors.append(f"Campo '{field}' ausente")
+
+    # Demais erros (tipos, enums, campos aninhados)
+    for error in sorted(validator.iter_errors(data), key=lambda e: list(e.absolute_path)):
+        if error.validator == "required" and not error.absolute_path:
+            continue
+        path = ".".join(str(part) for part in error.absolute_path) or "(raiz)"
+        errors.append(f"Campo '{path}' inválido: {error.message}")
 
     return len(errors) == 0, errors
 
 
+def entity_budget(client: LLMClient, entity_type: str) -> int:
+    """Máximo de tokens de conteúdo de uma entidade por requisição ao modelo."""
+    system_prompt, prefix, _ = split_prompt(entity_type, "")
+    return content_budget(
+        estimate_tokens(system_prompt + prefix), client.num_ctx, DEFAULT_NUM_PREDICT
+    )
+
+
+def coalesce_key(entity_type: str, entity_content: str) -> str:
+    """Chave de coalescência: tipo de prompt (ver PROMPT_FALLBACKS) e conteúdo normalizado."""
+    return RequestCoalescer.key(PROMPT_FALLBACKS.get(entity_type, entity_type), entity_content)
+
+
 def process_entity(
     client: LLMClient,
     entity_content: str,
     entity_type: str,
-    retries: int = 2
+    retries: int = 2,
+    models: Optional[list[str]] = None
 ) -> tuple[Optional[dict], list[str]]:
     """
     Processa uma entidade e retorna o JSON.
 
+    Com `settings.coalescer` (ver `RunSettings`), pedidos com a mesma
+    `coalesce_key` na mesma execução compartilham uma inferência: os simultâneos esperam o primeiro
+    e os seguintes recebem o resultado guardado (falhas são refeitas).
+
+    Entidades acima do orçamento de tokens (ver `entity_budget`) são
+    divididas nos subtítulos, extraídas por partes e juntadas com
+    `merge_parts`. Cada parte é validada só nos tipos dos campos (ver
+    `validate_json_structure`); os campos obrigatórios são conferidos uma
+    vez, no JSON das partes juntas. Nada é enviado ao modelo se nem o prompt fixo cabe no
+    contexto.
+
+    Com mais de um modelo, cada texto passa pela cascata de `_extract_cascade`:
+    o modelo seguinte só é chamado quando o anterior não produz um JSON válido.
+
     Args:
         client: Cliente LLM
         entity_content: Conteúdo textual da entidade
         entity_type: Tipo de entidade
-        retries: Número de tentativas
+        retries: Número de tentativas (no último modelo da cascata)
+        models: Modelos do mais barato ao mais caro (padrão: `client.models`)
 
     Returns:
         Tupla (json_data ou None, lista_de_erros)
     """
+    coalescer = client.settings.coalescer
+    if coalescer is None:
+        return _process_entity(client, entity_content, entity_type, retries, models)
+
+    result, shared = coalescer.run(
+        coalesce_key(entity_type, entity_content),
+        lambda: _process_entity(client, entity_content, entity_type, retries, models),
+        keep=lambda result: result[0] is not None
+    )
+    if shared:
+        client.last_metrics = {"cached": True, "coalesced": True}
+    return result
+
+
+def _process_entity(
+    client: LLMClient,
+    entity_content: str,
+    entity_type: str,
+    retries: int,
+    models: Optional[list[str]]
+) -> tuple[Optional[dict], list[str]]:
+    """Processa uma entidade (ver `process_entity`), sem coalescência."""
+    budget = entity_budget(client, entity_type)
+    if budget <= 0:
+        return None, [
+            f"O prompt de '{entity_type}' não cabe no contexto do modelo ({client.num_ctx} tokens)"
+        ]
+
+    models = models or client.models
+    if estimate_tokens(entity_content) <= budget:
+        return _extract_cascade(client, entity_content, entity_type, retries, models)
+
+    # As partes seguintes levam o nome da entidade para o modelo saber de quem se trata
+    header = entity_content.split("\n", 1)[0].strip()
+    parts = split_content(entity_content, budget - estimate_tokens(header) - 16)
+
+    results = []
+    for number, part in enumerate(parts, 1):
+        if number > 1:
+            part = f"{header} (continuação, parte {number} de {len(parts)})\n{part}"
+        json_data, errors = _extract_cascade(client, part, entity_type, retries, models, partial=True)
+        if json_data is None:
+            return None, [f"Parte {number}/{len(parts)}: {e}" for e in errors]
+        results.append(json_data)
+
+    merged = merge_parts(results)
+    is_valid, validation_errors = validate_json_structure(merged, entity_type)
+    if not is_valid:
+        return None, [f"JSON das partes juntas: {e}" for e in validation_errors]
+    return merged, []
+
+
+def _extract_cascade(
+    client: LLMClient,
+    entity_content: str,
+    entity_type: str,
+    retries: int,
+    models: list[str],
+    partial: bool = False
+) -> tuple[Optional[dict], list[str]]:
+    """
+    Extrai o JSON passando pelos modelos em ordem até um deles acertar.
+
+    Os modelos antes do último têm uma tentativa e um reparo; o último tem
+    todas as `retries`. Nos `settings.speculative_types`, a primeira
+    tentativa de cada modelo é especulativa (ver `_extract_speculative`).
+    Com `settings.limits`, registra o acerto ou a falha de cada modelo no tipo de
+    entidade (ver `GenerationLimits.model_hit_rates`), exceto respostas
+    vindas do cache. `partial` marca uma parte de entidade dividida (ver
+    `validate_json_structure`).
+    """
+    settings = client.settings
+    errors = []
+    for position, model in enumerate(models):
+        last = position == len(models) - 1
+        model_retries = retries if last else min(retries, 1)
+        if settings.speculative > 1 and entity_type in settings.speculative_types:
+            json_data, model_errors = _extract_speculative(
+                client, entity_content, entity_type, settings.speculative, model, partial
+            )
+            if json_data is None:
+                # Nenhuma amostra válida: segue com as tentativas em sequência
+                json_data, retry_errors = _extract_entity(
+                    client, entity_content, entity_type, max(model_retries - 1, 0), model, partial
+                )
+                model_errors += retry_errors
+        else:
+            json_data, model_errors = _extract_entity(
+                client, entity_content, entity_type, model_retries, model, partial
+            )
+        if settings.limits and not client.last_metrics.get("cached"):
+            settings.limits.record_model(entity_type, model, json_data is not None)
+        if json_data is not None:
+            return json_data, []
+        errors.extend(f"[{model}] {e}" if len(models) > 1 else e for e in model_errors)
+    return None, errors
+
+
+def backoff_delay(attempt: int) -> float:
+    """Espera antes da tentativa seguinte: exponencial, com jitter e teto."""
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _extract_entity(
+    client: LLMClient,
+    entity_content: str,
+    entity_type: str,
+    retries: int = 2,
+    model: Optional[str] = None,
+    partial: bool = False
+) -> tuple[Optional[dict], list[str]]:
+    """
+    Extrai o JSON de um texto que cabe em uma requisição.
+
+    A primeira tentativa pode vir do cache de respostas; as seguintes vão
+    sempre ao modelo, e só respostas válidas são guardadas.
+
+    Falhas de transporte (timeout, conexão) esperam `backoff_delay` antes
+    de tentar de novo. Um JSON completo que não passa na validação é
+    corrigido por uma requisição de reparo, que leva só o JSON e os erros;
+    se o reparo também falhar, a tentativa seguinte volta ao prompt
+    completo. Uma resposta cortada (`eval_count` no limite, ou JSON que não
+    fecha) nunca vai ao reparo, que sem o texto original inventaria os
+    campos: o prompt completo é reenviado com DEFAULT_NUM_PREDICT.
+
+    Com `settings.limits`, o `num_predict` e o timeout vêm do histórico do
+    tipo, alimentado só pelas respostas completas ao prompt original (não
+    pelas de reparo); um timeout estourado dobra o prazo da tentativa
+    seguinte.
+    """
     errors = []
+    schema = get_schema(entity_type, partial) if client.structured_output else None
+    limits = client.settings.limits
+    num_predict, timeout = DEFAULT_NUM_PREDICT, DEFAULT_TIMEOUT
+    if limits:
+        num_predict = limits.num_predict(entity_type, DEFAULT_NUM_PREDICT)
+        timeout = limits.timeout(entity_type, DEFAULT_TIMEOUT)
+
+    system_prompt, prefix, content = split_prompt(entity_type, entity_content)
+    user_prompt = prefix + content
+    # JSON inválido da tentativa anterior e seus erros, a corrigir na próxima
+    to_repair: Optional[tuple[str, list[str]]] = None
+    # Se a última resposta ao prompt original veio pelo prefixo reaproveitado
+    prefix_reused = False
 
     for attempt in range(retries + 1):
+        repairing = to_repair is not None
+        label = f"Tentativa {attempt + 1}" + (" (reparo)" if repairing else "")
         try:
-            system_prompt, user_prompt = get_prompt(entity_type, entity_content)
-            response = client.generate(system_prompt, user_prompt)
+            if repairing:
+                request_system, request_user = get_repair_prompt(entity_type, *to_repair)
+                to_repair = None
+            else:
+                request_system, request_user = system_prompt, user_prompt
+
+            try:
+                response = client.generate(
+                    request_system, request_user, num_predict=num_predict,
+                    use_cache=attempt == 0, schema=schema,
+                    prefix=None if repairing else prefix, timeout=timeout, model=model
+                )
+            except TimeoutError:
+                timeout *= 2
+                raise
+
+            metrics = client.last_metrics
+            if not repairing:
+                prefix_reused = bool(metrics.get("prefix_reused"))
+            truncated = (
+                (metrics.get("eval_count") or 0) >= num_predict and not metrics.get("early_stop")
+            ) or json_unterminated(response)
+            if truncated:
+                # Resposta cortada: não entra nas estatísticas e a próxima tentativa usa o máximo
+                num_predict = DEFAULT_NUM_PREDICT
+            elif limits and not repairing:
+                # O reparo (prompt e resposta curtos) distorceria os custos do conteúdo da entidade
+                limits.observe(entity_type, metrics, estimate_tokens(content))
 
             json_data = extract_json_from_response(response)
             if json_data is None:
-                errors.append(f"Tentativa {attempt + 1}: Não foi possível extrair JSON da resposta")
+                if truncated:
+                    errors.append(f"{label}: Resposta cortada antes do fim do JSON")
+                else:
+                    errors.append(f"{label}: Não foi possível extrair JSON da resposta")
                 continue
 
-            is_valid, validation_errors = validate_json_structure(json_data, entity_type)
+            is_valid, validation_errors = validate_json_structure(json_data, entity_type, partial)
             if not is_valid:
-                errors.extend([f"Tentativa {attempt + 1}: {e}" for e in validation_errors])
+                errors.extend([f"{label}: {e}" for e in validation_errors])
+                if not repairing and not truncated:
+                    to_repair = (json.dumps(json_data, ensure_ascii=False), validation_errors)
                 continue
 
+            if repairing:
+                # O JSON corrigido fica no cache como resposta do prompt original
+                response = json.dumps(json_data, ensure_ascii=False)
+            client.remember(
+                system_prompt, user_prompt, response, schema=schema, model=model,
+                prefix_reused=prefix_reused
+            )
             return json_data, []
 
+        except (TimeoutError, ConnectionError) as e:
+            errors.append(f"{label}: {str(e)}")
+            if attempt < retries:
+                time.sleep(backoff_delay(attempt))
+
         except Exception as e:
-            errors.append(f"Tentativa {attempt + 1}: {str(e)}")
+            errors.append(f"{label}: {str(e)}")
+
+    return None, errors
+
+
+def _extract_speculative(
+    client: LLMClient,
+    entity_content: str,
+    entity_type: str,
+    samples: int,
+    model: Optional[str] = None,
+    partial: bool = False
+) -> tuple[Optional[dict], list[str]]:
+    """
+    Extrai o JSON com `samples` requisições simultâneas e fica com a primeira válida.
+
+    Cada amostra usa uma temperatura de SPECULATIVE_TEMPERATURES e uma seed
+    própria. Assim que uma resposta passa na validação, as demais são
+    canceladas (a conexão é fechada e o Ollama para de gerar) e a vencedora
+    fica no cache como resposta do prompt usual. Troca capacidade ociosa
+    dos servidores por menos tempo nas entidades que costumam precisar de
+    várias tentativas.
+    """
+    schema = get_schema(entity_type, partial) if client.structured_output else None
+    limits = client.settings.limits
+    num_predict, timeout = DEFAULT_NUM_PREDICT, DEFAULT_TIMEOUT
+    if limits:
+        num_predict = limits.num_predict(entity_type, DEFAULT_NUM_PREDICT)
+        timeout = limits.timeout(entity_type, DEFAULT_TIMEOUT)
+
+    system_prompt, prefix, content = split_prompt(entity_type, entity_content)
+    user_prompt = prefix + content
+
+    cached = client.lookup(system_prompt, user_prompt, schema=schema, model=model, prefix=prefix)
+    if cached is not None:
+        json_data = extract_json_from_response(cached)
+        if json_data is not None and validate_json_structure(json_data, entity_type, partial)[0]:
+            client.last_metrics = {"cached": True, "model": model or client.model}
+            return json_data, []
 
-        if attempt < retries:
-            time.sleep(1)  # Pequena pausa entre tentativas
+    cancel = threading.Event()
+
+    def sample(number: int) -> tuple[str, Optional[dict], list[str], dict]:
+        response = client.generate(
+            system_prompt, user_prompt,
+            temperature=SPECULATIVE_TEMPERATURES[number % len(SPECULATIVE_TEMPERATURES)],
+            num_predict=num_predict, use_cache=False, schema=schema, prefix=prefix,
+            timeout=timeout, model=model, seed=number, cancel=cancel
+        )
+        metrics = client.last_metrics
+        json_data = extract_json_from_response(response)
+        if json_data is None:
+            return response, None, ["Não foi possível extrair JSON da resposta"], metrics
+        is_valid, validation_errors = validate_json_structure(json_data, entity_type, partial)
+        return response, json_data if is_valid else None, validation_errors, metrics
+
+    errors = []
+    executor = ThreadPoolExecutor(max_workers=samples)
+    futures = {executor.submit(sample, number): number for number in range(samples)}
+    try:
+        for future in as_completed(futures):
+            label = f"Amostra {futures[future] + 1}"
+            try:
+                response, json_data, sample_errors, metrics = future.result()
+            except RequestCancelled:
+                continue
+            except Exception as e:
+                errors.append(f"{label}: {str(e)}")
+                continue
+
+            truncated = (metrics.get("eval_count") or 0) >= num_predict and not metrics.get("early_stop")
+            if limits and not truncated:
+                limits.observe(entity_type, metrics, estimate_tokens(content))
+
+            if json_data is None:
+                errors.extend([f"{label}: {e}" for e in sample_errors])
+                continue
+
+            cancel.set()
+            client.remember(
+                system_prompt, user_prompt, response, schema=schema, model=model,
+                prefix_reused=bool(metrics.get("prefix_reused"))
+            )
+            client.last_metrics = {**metrics, "speculative": samples, "sample": futures[future] + 1}
+            return json_data, []
+    finally:
+        # As amostras que ainda não terminaram encerram sozinhas ao ver o cancelamento
+        cancel.set()
+        executor.shutdown(wait=False, cancel_futures=True)
 
     return None, errors
 
 
+def _batch_items(data) -> list:
+    """Lista de objetos de uma resposta em lote (aceita o array dentro de um objeto)."""
+    if isinstance(data, dict):
+        lists = [value for value in data.values() if isinstance(value, list)]
+        data = lists[0] if len(lists) == 1 else [data]
+    if not isinstance(data, list):
+        return []
+    return [item for item in data if isinstance(item, dict)]
+
+
+def _match_batch_items(names: list[str], items: list[dict]) -> list[Optional[dict]]:
+    """
+    Associa os objetos de uma resposta em lote às entidades pelo nome.
+
+    Compara o slug do nome (ou o id) de cada objeto com o slug do nome
+    capturado no cabeçalho de cada entidade. Se o modelo devolveu um objeto
+    por entidade, os que sobrarem ocupam as posições ainda livres na ordem
+    original.
+
+    Returns:
+        Lista alinhada com `names`, com None onde nada foi associado
+    """
+    slugs = [slugify(name) for name in names]
+    matched: list[Optional[dict]] = [None] * len(names)
+    leftovers = []
+
+    for item in items:
+        item_slugs = {slugify(str(item.get("name") or "")), str(item.get("id") or "")}
+        position = next(
+            (i for i, slug in enumerate(slugs) if matched[i] is None and slug in item_slugs),
+            None
+        )
+        if position is None:
+            leftovers.append(item)
+        else:
+            matched[position] = item
+
+    if len(items) == len(names):
+        free = [i for i, item in enumerate(matched) if item is None]
+        for position, item in zip(free, leftovers):
+            matched[position] = item
+
+    return matched
+
+
+def process_batch(
+    client: LLMClient,
+    entities: list[dict],
+    entity_type: str,
+    retries: int = 2
+) -> list[tuple[Optional[dict], list[str]]]:
+    """
+    Processa várias entidades pequenas em uma única chamada ao modelo.
+
+    Pede um array JSON com um objeto por entidade e associa os objetos às
+    entidades pelo nome capturado no cabeçalho. O lote vai ao primeiro
+    modelo da cascata, com `num_predict` e timeout estimados pela soma dos
+    tokens das entidades (ver `GenerationLimits.for_content`); entidades
+    sem objeto válido na resposta são reprocessadas individualmente com
+    `process_entity`, e o motivo aparece no log e nos erros delas.
+
+    Com `settings.coalescer`, entidades repetidas no lote ou já pedidas na
+    execução ficam fora do lote e passam por `process_entity`, que
+    compartilha o resultado; os objetos válidos do lote ficam guardados.
+
+    Returns:
+        Lista de tuplas (json_data ou None, lista_de_erros), na ordem de `entities`
+    """
+    keys = None
+    coalescer = client.settings.coalescer
+    if coalescer is not None and len(entities) > 1:
+        keys = [coalesce_key(entity_type, entity["content"]) for entity in entities]
+        fresh = [
+            i for i, key in enumerate(keys)
+            if key not in coalescer and key not in keys[:i]
+        ]
+        if len(fresh) < len(entities):
+            batched = process_batch(client, [entities[i] for i in fresh], entity_type, retries) if fresh else []
+            results = dict(zip(fresh, batched))
+            return [
+                results[i] if i in results
+                else process_entity(client, entity["content"], entity_type, retries)
+                for i, entity in enumerate(entities)
+            ]
+
+    if len(entities) == 1:
+        return [process_entity(client, entities[0]["content"], entity_type, retries)]
+
+    # Lote acima do orçamento de tokens: divide ao meio
+    contents = "".join(entity["content"] for entity in entities)
+    if estimate_tokens(contents) + 10 * len(entities) > entity_budget(client, entity_type):
+        middle = len(entities) // 2
+        return (
+            process_batch(client, entities[:middle], entity_type, retries)
+            + process_batch(client, entities[middle:], entity_type, retries)
+        )
+
+    schema = None
+    if client.structured_output:
+        schema = {"type": "array", "items": get_schema(entity_type), "minItems": len(entities)}
+
+    num_predict, timeout = DEFAULT_NUM_PREDICT, DEFAULT_TIMEOUT
+    if client.settings.limits:
+        num_predict, timeout = client.settings.limits.for_content(
+            entity_type,
+            sum(estimate_tokens(entity["content"]) for entity in entities),
+            DEFAULT_NUM_PREDICT,
+            DEFAULT_TIMEOUT
+        )
+
+    matched: list[Optional[dict]] = [None] * len(entities)
+    batch_error = None
+    try:
+        system_prompt, user_prompt = get_batch_prompt(
+            entity_type, [entity["content"] for entity in entities]
+        )
+        model = client.models[0]
+        response = client.generate(
+            system_prompt, user_prompt, num_predict=num_predict, schema=schema,
+            timeout=timeout, model=model
+        )
+        items = _match_batch_items(
+            [entity.get("name") or entity["header"].split("\n")[0] for entity in entities],
+            _batch_items(extract_json_from_response(response, prefer=list))
+        )
+        for i, item in enumerate(items):
+            if item is not None and validate_json_structure(item, entity_type)[0]:
+                matched[i] = item
+                if keys is not None:
+                    coalescer.settle(keys[i], (item, []))
+
+        if all(item is not None for item in matched):
+            client.remember(system_prompt, user_prompt, response, schema=schema, model=model)
+        else:
+            batch_error = "sem objeto válido na resposta do lote"
+    except (TimeoutError, ConnectionError, ValueError) as e:
+        batch_error = str(e)
+
+    if batch_error:
+        missing = sum(item is None for item in matched)
+        tqdm.write(f"Lote de {len(entities)} ({entity_type}): {batch_error}; "
+                   f"{missing} entidade(s) processada(s) individualmente")
+
+    results = []
+    for entity, item in zip(entities, matched):
+        if item is not None:
+            results.append((item, []))
+            continue
+        json_data, errors = process_entity(client, entity["content"], entity_type, retries)
+        results.append((json_data, [f"Lote: {batch_error}"] + errors if json_data is None else errors))
+    return results
+
+
+class _StageError:
+    """Exceção levantada em um estágio, repassada pela fila ao consumidor."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_DONE = object()
+
+
+def _produce_stage(entities: Iterable[dict], outbox: queue.Queue, consumers: int = 1) -> None:
+    """
+    Estágio de extração/divisão: coloca cada entidade na fila assim que sai do PDF.
+
+    As entidades vão numeradas para que a saída possa ser reordenada; ao
+    final, envia um marcador de fim para cada consumidor.
+    """
+    try:
+        for index, entity in enumerate(entities):
+            outbox.put((index, entity))
+    except BaseException as e:
+        outbox.put(_StageError(e))
+    finally:
+        for _ in range(consumers):
+            outbox.put(_DONE)
+
+
+def _process_stage(
+    client: "LLMClient",
+    entity_type: str,
+    inbox: queue.Queue,
+    outbox: queue.Queue,
+    batch_size: int = 1
+) -> None:
+    """
+    Estágio de prompt → LLM → parse/validação das entidades.
+
+    Entidades com a chave "entity_type" usam esse tipo no lugar de
+    `entity_type`. Com `batch_size` > 1, junta até esse número de entidades
+    pequenas (até BATCH_MAX_CHARS) do mesmo tipo em uma única chamada; as
+    maiores seguem sozinhas.
+    """
+    done = False
+    while not done:
+        batch = []
+        batch_type = None
+        while len(batch) < batch_size:
+            item = inbox.get()
+            if item is _DONE:
+                done = True
+                break
+            if isinstance(item, _StageError):
+                outbox.put(item)
+                continue
+
+            item_type = item[1].get("entity_type", entity_type)
+            if len(item[1]["content"]) > BATCH_MAX_CHARS:
+                _process_items(client, item_type, [item], outbox)
+                continue
+            if batch and item_type != batch_type:
+                # Mudou o tipo: o lote atual segue sem completar
+                _process_items(client, batch_type, batch, outbox)
+                batch = []
+            batch.append(item)
+            batch_type = item_type
+            if batch_size == 1:
+                break
+
+        if batch:
+            _process_items(client, batch_type, batch, outbox)
+
+    outbox.put(_DONE)
+
+
+def _process_items(
+    client: "LLMClient",
+    entity_type: str,
+    items: list[tuple[int, dict]],
+    outbox: queue.Queue
+) -> None:
+    """Processa uma entidade ou um lote e envia um resultado por entidade."""
+    entities = [entity for _, entity in items]
+    try:
+        if len(entities) == 1:
+            results = [process_entity(client, entities[0]["content"], entity_type)]
+        else:
+            results = process_batch(client, entities, entity_type)
+    except Exception as e:
+        results = [(None, [str(e)])] * len(entities)
+
+    metrics = client.last_metrics
+    if len(entities) > 1:
+        metrics = {**metrics, "batch": len(entities)}
+    for (index, entity), (json_data, errors) in zip(items, results):
+        outbox.put((index, entity, json_data, errors, metrics))
+
+
+def estimate_cost(entity: dict, entity_type: str, limits: Optional[GenerationLimits] = None) -> float:
+    """
+    Tempo estimado (segundos) para processar uma entidade.
+
+    Tokens estimados do conteúdo × segundos por token do tipo no histórico
+    (`GenerationLimits.seconds_per_token`), ou DEFAULT_SECONDS_PER_TOKEN.
+    """
+    rate = limits.seconds_per_token(entity_type) if limits else None
+    return estimate_tokens(entity["content"]) * (rate or DEFAULT_SECONDS_PER_TOKEN)
+
+
+def order_longest_first(
+    entities: Iterable[dict],
+    entity_type: Optional[str],
+    limits: Optional[GenerationLimits] = None,
+    priorities: Optional[dict[str, int]] = None
+) -> list[dict]:
+    """
+    Ordena as entidades para despacho do maior custo estimado para o menor (LPT).
+
+    Começar pelas entidades mais longas evita que uma classe ou criatura
+    enorme despachada por último deixe a execução esperando um único worker.
+    Com `priorities` (seção -> prioridade), seções de prioridade maior vão
+    antes, independentemente do custo.
+
+    Args:
+        entities: Entidades (as com chave "entity_type" usam esse tipo)
+        entity_type: Tipo das entidades sem a chave "entity_type"
+        limits: Histórico de geração usado na estimativa de custo
+        priorities: Prioridade por seção (chave "section" das entidades)
+
+    Returns:
+        Lista de entidades na ordem de despacho
+    """
+    priorities = priorities or {}
+    return sorted(
+        entities,
+        key=lambda entity: (
+            -priorities.get(entity.get("section"), 0),
+            -estimate_cost(entity, entity.get("entity_type", entity_type), limits)
+        )
+    )
+
+
+def run_stages(
+    entities: Iterable[dict],
+    client: "LLMClient",
+    entity_type: Optional[str],
+    concurrency: int = 1,
+    queue_size: int = QUEUE_SIZE,
+    batch_size: int = 1
+) -> Generator[tuple[dict, Optional[dict], list[str], dict], None, None]:
+    """
+    Processa entidades em estágios ligados por filas limitadas.
+
+    A extração do PDF roda em uma thread e o processamento pelo LLM em
+    `concurrency` threads, então a primeira chamada ao modelo acontece assim
+    que a primeira entidade fica pronta e até `concurrency` requisições
+    ficam em paralelo no servidor. As filas limitadas seguram a extração
+    quando o modelo fica para trás, limitando a memória. Com `batch_size`
+    > 1, entidades pequenas vão ao modelo em lotes (ver `process_batch`).
+    Entidades com a chave "entity_type" usam esse tipo no lugar de
+    `entity_type`, o que permite misturar seções de tipos diferentes.
+
+    Yields:
+        Tuplas (entidade, json_data ou None, lista_de_erros, métricas da última
+        chamada ao modelo) na ordem das entidades
+    """
+    concurrency = max(concurrency, 1)
+    batch_size = max(batch_size, 1)
+    extracted = queue.Queue(maxsize=max(queue_size, batch_size * concurrency))
+    processed = queue.Queue(maxsize=queue_size)
+
+    threading.Thread(
+        target=_produce_stage, args=(entities, extracted, concurrency), daemon=True
+    ).start()
+    for _ in range(concurrency):
+        threading.Thread(
+            target=_process_stage,
+            args=(client, entity_type, extracted, processed, batch_size),
+            daemon=True
+        ).start()
+
+    # Resultados que chegaram antes dos anteriores aguardam aqui
+    pending: dict[int, tuple] = {}
+    next_index = 0
+    finished = 0
+
+    while finished < concurrency:
+        result = processed.get()
+        if result is _DONE:
+            finished += 1
+            continue
+        if isinstance(result, _StageError):
+            raise result.error
+
+        index, *rest = result
+        pending[index] = tuple(rest)
+        while next_index in pending:
+            yield pending.pop(next_index)
+            next_index += 1
+
+
+def default_output_dir(entity_type: str) -> Path:
+    """Diretório de saída padrão de um tipo de entidade (src/json/<tipo>)."""
+    return Path(__file__).parent.parent.parent / "src" / "json" / entity_type
+
+
+def connect_client(
+    model: Union[str, list[str]] = DEFAULT_MODEL,
+    ollama_url: Union[str, list[str]] = OLLAMA_URL,
+    concurrency: int = 1,
+    response_cache: str = DEFAULT_RESPONSE_CACHE,
+    stream: bool = False,
+    structured_output: bool = False,
+    reuse_prefix: bool = False,
+    num_ctx: int = DEFAULT_NUM_CTX,
+    generation_stats: str = DEFAULT_STATS_PATH,
+    adaptive_limits: bool = True,
+    speculative: int = 1,
+    speculative_types: Iterable[str] = SPECULATIVE_TYPES,
+    coalesce: bool = True
+) -> LLMClient:
+    """
+    Cria o cliente LLM e verifica o servidor e o modelo.
+
+    Com mais de uma URL, cria um `LLMClientPool` que distribui as
+    requisições entre os servidores. Com mais de um modelo, o cliente os
+    usa em cascata, do primeiro ao último. Encerra o programa se nenhum
+    servidor responder.
+    """
+    urls = [ollama_url] if isinstance(ollama_url, str) else list(ollama_url)
+    models = [model] if isinstance(model, str) else list(model)
+    options = {
+        "model": models[0],
+        "pool_size": max(concurrency * max(speculative, 1), DEFAULT_POOL_SIZE),
+        "cache": ResponseCache(response_cache) if response_cache else None,
+        "stream": stream,
+        "structured_output": structured_output,
+        "reuse_prefix": reuse_prefix,
+        "num_ctx": num_ctx,
+        "settings": RunSettings(
+            cascade=models,
+            limits=GenerationLimits(generation_stats, adaptive=adaptive_limits) if generation_stats else None,
+            speculative=speculative,
+            speculative_types=speculative_types,
+            coalescer=RequestCoalescer() if coalesce else None,
+        ),
+    }
+    if len(urls) == 1:
+        client = LLMClient(base_url=urls[0], **options)
+    else:
+        client = LLMClientPool(urls, **options)
+
+    if not client.check_connection():
+        print(f"Erro: Ollama não está rodando em {client.base_url}.")
+        print("Inicie com: ollama serve")
+        sys.exit(1)
+
+    available_models = client.list_models()
+    for model in models:
+        if model not in available_models and model not in [m.split(":")[0] for m in available_models]:
+            print(f"Aviso: Modelo '{model}' pode não estar instalado.")
+            print(f"Modelos disponíveis: {available_models}")
+            print(f"Instale com: ollama pull {model}")
+
+    return client
+
+
+def save_result(
+    output_path: Path,
+    journal: RunJournal,
+    stats: dict,
+    entity: dict,
+    json_data: Optional[dict],
+    errors: list[str],
+    metrics: dict
+) -> None:
+    """Grava o JSON de uma entidade processada, registra no diário e atualiza as estatísticas."""
+    header = entity["header"]
+    content_hash = RunJournal.content_hash(entity["content"])
+    stats["total"] += 1
+    ttft = f" (TTFT {metrics['ttft']:.2f}s)" if metrics.get("ttft") is not None else ""
+
+    if json_data:
+        filename = write_entity(output_path, header, json_data)
+        journal.record(header, content_hash, "success", filename, metrics=metrics)
+        stats["success"] += 1
+        tqdm.write(f"✓ {header} -> {filename}{ttft}")
+    else:
+        journal.record(header, content_hash, "failed", errors=errors, metrics=metrics)
+        stats["failed"] += 1
+        stats["errors"].append({
+            "entity": header,
+            "errors": errors
+        })
+        tqdm.write(f"✗ {header}: {errors[-1] if errors else 'Erro desconhecido'}")
+
+
+def write_entity(output_path: Path, header: str, json_data: dict) -> str:
+    """
+    Salva o JSON de uma entidade no diretório de saída.
+
+    Returns:
+        Nome do arquivo gravado
+    """
+    # Garantir que o ID está correto
+    if "id" not in json_data or not json_data["id"]:
+        json_data["id"] = slugify(header)
+
+    filename = f"{json_data['id']}.json"
+    filepath = output_path / filename
+
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(json_data, f, ensure_ascii=False, indent=2)
+
+    return filename
+
+
 def run_pipeline(
     pdf_path: str,
     section: str,
     entity_type: str,
-    model: str = DEFAULT_MODEL,
+    model: Union[str, list[str]] = DEFAULT_MODEL,
     output_dir: str = None,
     dry_run: bool = False,
     toc_start: int = 3,
-    toc_end: int = 6
+    toc_end: int = 6,
+    use_outline: bool = True,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    pdf_workers: int = 1,
+    text_file: str = None,
+    concurrency: int = 1,
+    ollama_url: Union[str, list[str]] = OLLAMA_URL,
+    response_cache: str = DEFAULT_RESPONSE_CACHE,
+    resume: bool = False,
+    stream: bool = False,
+    structured_output: bool = False,
+    batch_size: int = 1,
+    reuse_prefix: bool = False,
+    num_ctx: int = DEFAULT_NUM_CTX,
+    generation_stats: str = DEFAULT_STATS_PATH,
+    adaptive_limits: bool = True,
+    longest_first: bool = False,
+    speculative: int = 1,
+    speculative_types: Iterable[str] = SPECULATIVE_TYPES,
+    coalesce: bool = True
 ) -> dict:
     """
     Executa o pipeline completo.
@@ -257,11 +1843,35 @@ def run_pipeline(
         pdf_path: Caminho para o PDF
         section: Seção do índice ou slug
         entity_type: Tipo de entidade
-        model: Modelo LLM a usar
+        model: Modelo LLM a usar (ou lista de modelos, do mais barato ao mais caro, em cascata)
         output_dir: Diretório de saída
         dry_run: Se True, não salva arquivos
         toc_start: Página inicial do índice
         toc_end: Página final do índice
+        use_outline: Usa o outline do PDF quando existir (senão, lê o índice pelo texto)
+        cache_dir: Diretório do cache de artefatos do PDF (None desativa)
+        pdf_workers: Processos usados na extração das páginas do PDF
+        text_file: Arquivo de texto do livro compartilhado via mmap
+        concurrency: Requisições simultâneas ao Ollama (ver OLLAMA_NUM_PARALLEL)
+        ollama_url: URL base do servidor Ollama (ou lista de URLs, distribuídas por um LLMClientPool)
+        response_cache: Banco do cache de respostas do LLM (None desativa)
+        resume: Pula entidades já concluídas com o mesmo conteúdo (ver o diário)
+        stream: Lê as respostas em streaming e encerra assim que o JSON fecha
+        structured_output: Restringe a geração ao JSON Schema do tipo de entidade
+        batch_size: Entidades pequenas enviadas juntas em uma chamada ao modelo
+        reuse_prefix: Reaproveita a avaliação do prefixo fixo do prompt (context do Ollama)
+        num_ctx: Tamanho do contexto do modelo; entidades maiores que o orçamento são divididas
+        generation_stats: Estatísticas de geração por tipo e acertos de cada modelo da
+            cascata (None não registra nada)
+        adaptive_limits: Ajusta num_predict e timeout pelas estatísticas (False mantém os
+            valores fixos, mas continua registrando)
+        longest_first: Extrai a seção inteira e despacha as entidades da mais cara para a
+            mais barata (ver `order_longest_first`)
+        speculative: Requisições simultâneas por entidade dos `speculative_types`; a
+            primeira resposta válida vence (1 desativa)
+        speculative_types: Tipos de entidade com amostragem especulativa
+        coalesce: Entidades repetidas na execução (mesmo conteúdo e tipo de prompt)
+            compartilham uma única inferência
 
     Returns:
         Estatísticas de execução
@@ -270,6 +1880,7 @@ def run_pipeline(
         "total": 0,
         "success": 0,
         "failed": 0,
+        "skipped": 0,
         "errors": []
     }
 
@@ -280,24 +1891,24 @@ def run_pipeline(
         sys.exit(1)
 
     # Inicializar cliente LLM
-    client = LLMClient(model=model)
-
-    if not client.check_connection():
-        print("Erro: Ollama não está rodando.")
-        print("Inicie com: ollama serve")
-        sys.exit(1)
-
-    available_models = client.list_models()
-    if model not in [m.split(":")[0] for m in available_models]:
-        print(f"Aviso: Modelo '{model}' pode não estar instalado.")
-        print(f"Modelos disponíveis: {available_models}")
-        print(f"Instale com: ollama pull {model}")
+    client = connect_client(
+        model=model,
+        ollama_url=ollama_url,
+        concurrency=concurrency,
+        response_cache=response_cache,
+        stream=stream,
+        structured_output=structured_output,
+        reuse_prefix=reuse_prefix,
+        num_ctx=num_ctx,
+        generation_stats=generation_stats,
+        adaptive_limits=adaptive_limits,
+        speculative=speculative,
+        speculative_types=speculative_types,
+        coalesce=coalesce
+    )
 
     # Preparar diretório de saída
-    if output_dir:
-        output_path = Path(output_dir)
-    else:
-        output_path = Path(__file__).parent.parent.parent / "src" / "json" / entity_type
+    output_path = Path(output_dir) if output_dir else default_output_dir(entity_type)
     output_path.mkdir(parents=True, exist_ok=True)
 
     print(f"\n{'='*60}")
@@ -306,60 +1917,70 @@ def run_pipeline(
     print(f"PDF: {pdf_path}")
     print(f"Seção: {section}")
     print(f"Tipo: {entity_type}")
-    print(f"Modelo: {model}")
+    print(f"Modelo: {' -> '.join(client.models)}")
+    print(f"Concorrência: {concurrency}")
+    if batch_size > 1:
+        print(f"Lote: até {batch_size} entidades por chamada")
+    if speculative > 1 and entity_type in client.settings.speculative_types:
+        print(f"Especulativo: {speculative} amostras por entidade")
     print(f"Saída: {output_path}")
     print(f"{'='*60}\n")
 
-    # Extrair entidades
+    # Abrir o PDF e localizar a seção
     print("Extraindo entidades do PDF...")
     try:
-        entities = extract_entities(pdf_path, section, entity_type)
+        extractor = open_extractor(
+            pdf_path, cache_dir=cache_dir, workers=pdf_workers, text_file=text_file,
+            toc_start=toc_start, toc_end=toc_end, use_outline=use_outline
+        )
+        section_slug, _ = extractor.resolve_section(section)
     except ValueError as e:
         print(f"Erro: {e}")
         print("\nListando seções disponíveis...")
-        sections = list_available_sections(pdf_path, toc_start, toc_end)
+        sections = list_available_sections(
+            pdf_path, toc_start, toc_end, cache_dir=cache_dir, use_outline=use_outline
+        )
         for slug, info in sections.items():
             print(f"  {slug}: {info['title']} (págs. {info['start_page']}-{info['end_page']})")
         sys.exit(1)
 
-    stats["total"] = len(entities)
-    print(f"Encontradas {len(entities)} entidades.\n")
+    entities = extractor.iter_entities(section, get_entity_pattern(section, entity_type))
 
     if dry_run:
         print("Modo dry-run: mostrando entidades encontradas")
         for entity in entities:
+            stats["total"] += 1
             print(f"  - {entity['header']}")
+        print(f"Encontradas {stats['total']} entidades.\n")
+        client.close()
         return stats
 
-    # Processar cada entidade
-    print("Processando entidades...\n")
-    for entity in tqdm(entities, desc="Processando"):
-        header = entity["header"]
-        content = entity["content"]
-
-        json_data, errors = process_entity(client, content, entity_type)
-
-        if json_data:
-            # Garantir que o ID está correto
-            if "id" not in json_data or not json_data["id"]:
-                json_data["id"] = slugify(header)
+    # Diário da seção: registra cada entidade concluída para permitir retomar
+    journal = RunJournal.for_section(output_path, section_slug)
+    done = journal.completed() if resume else {}
+    if done:
+        print(f"Retomando: {len(done)} entidades já concluídas no diário.")
 
-            # Salvar arquivo
-            filename = f"{json_data['id']}.json"
-            filepath = output_path / filename
+    def pending_entities():
+        for entity in entities:
+            if RunJournal.content_hash(entity["content"]) in done:
+                stats["skipped"] += 1
+                continue
+            yield entity
 
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(json_data, f, ensure_ascii=False, indent=2)
+    # Processar as entidades à medida que são extraídas (ou da mais cara para a mais barata)
+    print("Processando entidades...\n")
+    pending = pending_entities()
+    if longest_first:
+        pending = order_longest_first(pending, entity_type, client.settings.limits)
+    results = run_stages(
+        pending, client, entity_type,
+        concurrency=concurrency, batch_size=batch_size
+    )
+    for entity, json_data, errors, metrics in tqdm(results, desc="Processando"):
+        save_result(output_path, journal, stats, entity, json_data, errors, metrics)
 
-            stats["success"] += 1
-            tqdm.write(f"✓ {header} -> {filename}")
-        else:
-            stats["failed"] += 1
-            stats["errors"].append({
-                "entity": header,
-                "errors": errors
-            })
-            tqdm.write(f"✗ {header}: {errors[-1] if errors else 'Erro desconhecido'}")
+    client.close()
 
     # Relatório final
     print(f"\n{'='*60}")
@@ -368,6 +1989,22 @@ def run_pipeline(
     print(f"Total processado: {stats['total']}")
     print(f"Sucesso: {stats['success']}")
     print(f"Falhas: {stats['failed']}")
+    if stats["skipped"]:
+        print(f"Puladas (já concluídas): {stats['skipped']}")
+    if client.cache:
+        print(f"Respostas do cache: {client.cache.hits}")
+    settings = client.settings
+    if settings.coalescer and settings.coalescer.shared:
+        print(f"Repetidas (inferência compartilhada): {settings.coalescer.shared}")
+    print_backend_report(client)
+    print_cascade_report(client, [entity_type])
+    if settings.limits and settings.limits.adaptive:
+        samples = settings.limits.samples(entity_type)
+        if samples >= MIN_SAMPLES:
+            print(f"Limites aprendidos para {entity_type}: "
+                  f"num_predict {settings.limits.num_predict(entity_type, DEFAULT_NUM_PREDICT)}, "
+                  f"timeout {settings.limits.timeout(entity_type, DEFAULT_TIMEOUT):.0f}s "
+                  f"({samples} amostras)")
 
     if stats["errors"]:
         print(f"\nEntidades com erro:")
@@ -379,6 +2016,92 @@ def run_pipeline(
     return stats
 
 
+def add_run_arguments(parser: argparse.ArgumentParser) -> None:
+    """Opções do modelo, dos caches e da extração comuns a pipeline.py e book.py."""
+    parser.add_argument("--model", "-m", nargs="+", default=[DEFAULT_MODEL],
+                        help=f"Modelo LLM a usar; com vários, do mais barato ao mais caro, cada "
+                             f"entidade só passa ao seguinte se o anterior falhar (padrão: {DEFAULT_MODEL})")
+    parser.add_argument("--ollama-url", nargs="+", default=[OLLAMA_URL],
+                        help=f"URL base do servidor Ollama; com várias, as requisições são "
+                             f"distribuídas entre elas (padrão: {OLLAMA_URL})")
+    parser.add_argument("--response-cache", default=str(DEFAULT_RESPONSE_CACHE),
+                        help=f"Banco do cache de respostas do LLM (padrão: {DEFAULT_RESPONSE_CACHE})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Não usa o cache de respostas do LLM")
+    parser.add_argument("--resume", action="store_true",
+                        help="Pula entidades já concluídas com o mesmo conteúdo em execuções anteriores")
+    parser.add_argument("--stream", action="store_true",
+                        help="Lê as respostas em streaming e encerra assim que o JSON fecha")
+    parser.add_argument("--schema", action="store_true",
+                        help="Restringe a geração ao JSON Schema do tipo de entidade (format do Ollama)")
+    parser.add_argument("--reuse-prefix", action="store_true",
+                        help="Avalia o prefixo fixo do prompt uma vez e reaproveita o contexto do Ollama")
+    parser.add_argument("--num-ctx", type=int, default=DEFAULT_NUM_CTX,
+                        help=f"Tamanho do contexto do modelo em tokens (padrão: {DEFAULT_NUM_CTX})")
+    parser.add_argument("--generation-stats", default=str(DEFAULT_STATS_PATH),
+                        help=f"Estatísticas de geração por tipo de entidade (padrão: {DEFAULT_STATS_PATH})")
+    parser.add_argument("--no-adaptive-limits", action="store_true",
+                        help="Usa num_predict e timeout fixos em vez dos aprendidos por tipo "
+                             "(as estatísticas continuam sendo registradas)")
+    parser.add_argument("--concurrency", "-c", type=int, default=1,
+                        help="Requisições simultâneas ao Ollama (padrão: 1)")
+    parser.add_argument("--batch-size", "-b", type=int, default=1,
+                        help="Entidades pequenas por chamada ao modelo (padrão: 1, sem lotes)")
+    parser.add_argument("--longest-first", action="store_true",
+                        help="Despacha as entidades da mais cara para a mais barata (menor tempo total "
+                             "com --concurrency)")
+    parser.add_argument("--speculative", type=int, default=1, metavar="K",
+                        help="Envia K requisições simultâneas (temperaturas diferentes) por entidade dos "
+                             "tipos de --speculative-types e fica com a primeira válida (padrão: 1)")
+    parser.add_argument("--speculative-types", nargs="+", default=list(SPECULATIVE_TYPES),
+                        help=f"Tipos de entidade com --speculative (padrão: {' '.join(SPECULATIVE_TYPES)})")
+    parser.add_argument("--no-coalesce", action="store_true",
+                        help="Envia ao modelo cada entidade repetida na execução em vez de compartilhar "
+                             "o resultado")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR),
+                        help=f"Diretório do cache de extração do PDF (padrão: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--no-pdf-cache", action="store_true",
+                        help="Não usa o cache de extração do PDF")
+    parser.add_argument("--pdf-workers", type=int, default=1,
+                        help="Processos para extrair as páginas do PDF (padrão: 1)")
+    parser.add_argument("--text-file",
+                        help="Arquivo de texto do livro lido via mmap (criado se não existir)")
+    parser.add_argument("--toc-start", type=int, default=3,
+                        help="Página inicial do índice (padrão: 3)")
+    parser.add_argument("--toc-end", type=int, default=6,
+                        help="Página final do índice (padrão: 6)")
+    parser.add_argument("--no-outline", action="store_true",
+                        help="Ignora os marcadores do PDF e lê o índice pelo texto")
+
+
+def run_options(args: argparse.Namespace) -> dict:
+    """Converte as opções de `add_run_arguments` em argumentos de `run_pipeline`/`run_book`."""
+    return {
+        "model": args.model,
+        "cache_dir": None if args.no_pdf_cache else args.cache_dir,
+        "pdf_workers": args.pdf_workers,
+        "text_file": args.text_file,
+        "toc_start": args.toc_start,
+        "toc_end": args.toc_end,
+        "use_outline": not args.no_outline,
+        "concurrency": args.concurrency,
+        "ollama_url": args.ollama_url,
+        "response_cache": None if args.no_cache else args.response_cache,
+        "resume": args.resume,
+        "stream": args.stream,
+        "structured_output": args.schema,
+        "batch_size": args.batch_size,
+        "reuse_prefix": args.reuse_prefix,
+        "num_ctx": args.num_ctx,
+        "generation_stats": args.generation_stats,
+        "adaptive_limits": not args.no_adaptive_limits,
+        "longest_first": args.longest_first,
+        "speculative": args.speculative,
+        "speculative_types": args.speculative_types,
+        "coalesce": not args.no_coalesce,
+    }
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Pipeline de extração de dados do Tormenta 20",
@@ -394,6 +2117,9 @@ Exemplos:
   # Extrair classes usando modelo específico
   python pipeline.py tormenta20.pdf classes classes --model llama3
 
+  # Condições em um modelo pequeno, com o maior só para as que falharem
+  python pipeline.py tormenta20.pdf condicoes condicoes --model llama3.2:1b llama3
+
   # Dry-run para ver entidades sem processar
   python pipeline.py tormenta20.pdf magias magias --dry-run
 
@@ -405,24 +2131,22 @@ Tipos de entidade disponíveis:
     parser.add_argument("pdf_path", help="Caminho para o PDF do Tormenta 20")
     parser.add_argument("section", nargs="?", help="Seção do índice para extrair")
     parser.add_argument("entity_type", nargs="?", help="Tipo de entidade")
-
-    parser.add_argument("--model", "-m", default=DEFAULT_MODEL,
-                        help=f"Modelo LLM a usar (padrão: {DEFAULT_MODEL})")
+    add_run_arguments(parser)
     parser.add_argument("--output-dir", "-o",
                         help="Diretório de saída para os JSONs")
     parser.add_argument("--dry-run", "-n", action="store_true",
                         help="Não processa, apenas mostra entidades encontradas")
     parser.add_argument("--list-sections", "-l", action="store_true",
                         help="Lista seções disponíveis no PDF")
-    parser.add_argument("--toc-start", type=int, default=3,
-                        help="Página inicial do índice (padrão: 3)")
-    parser.add_argument("--toc-end", type=int, default=6,
-                        help="Página final do índice (padrão: 6)")
 
     args = parser.parse_args()
+    cache_dir = None if args.no_pdf_cache else args.cache_dir
 
     if args.list_sections:
-        sections = list_available_sections(args.pdf_path, args.toc_start, args.toc_end)
+        sections = list_available_sections(
+            args.pdf_path, args.toc_start, args.toc_end,
+            cache_dir=cache_dir, use_outline=not args.no_outline
+        )
         print("\nSeções disponíveis:")
         print("=" * 60)
         for slug, info in sections.items():
@@ -438,11 +2162,9 @@ Tipos de entidade disponíveis:
         pdf_path=args.pdf_path,
         section=args.section,
         entity_type=args.entity_type,
-        model=args.model,
         output_dir=args.output_dir,
         dry_run=args.dry_run,
-        toc_start=args.toc_start,
-        toc_end=args.toc_end
+        **run_options(args)
     )
 
 
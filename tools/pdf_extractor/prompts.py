@@ -757,6 +757,321 @@ TEXTO DA CONDIÇÃO:
 }
 
 
+# ===========================================
+# SCHEMAS (JSON Schema) POR TIPO DE ENTIDADE
+# ===========================================
+# Usados para restringir a geração (parâmetro "format" do Ollama) e para
+# validar as respostas. Campos opcionais aceitam null, como pede o
+# SYSTEM_PROMPT; "required" lista os campos sem os quais a entidade é
+# descartada.
+
+_STRING = {"type": ["string", "null"]}
+_INTEGER = {"type": ["integer", "null"]}
+_NUMBER = {"type": ["number", "null"]}
+_BOOLEAN = {"type": ["boolean", "null"]}
+_SLUGS = {"type": ["array", "null"], "items": {"type": "string"}}
+_OBJECT = {"type": ["object", "null"]}
+_ATTRIBUTE = {"type": ["string", "null"], "enum": ["for", "des", "con", "int", "sab", "car", None]}
+
+_EFFECTS = {
+    "type": ["array", "null"],
+    "items": {"type": "object"}
+}
+
+_ABILITIES = {
+    "type": ["array", "null"],
+    "items": {
+        "type": "object",
+        "required": ["name"],
+        "properties": {
+            "id": {"type": "string"},
+            "name": {"type": "string"},
+            "description": _STRING,
+            "effects": _EFFECTS,
+        }
+    }
+}
+
+
+def _entity_schema(title: str, properties: dict, required: tuple = ()) -> dict:
+    """Monta o schema de uma entidade com os campos comuns id e name."""
+    return {
+        "$schema": "http://json-schema.org/draft-07/schema#",
+        "title": title,
+        "type": "object",
+        "required": ["id", "name", *required],
+        "properties": {
+            "id": {"type": "string"},
+            "name": {"type": "string"},
+            **properties,
+        }
+    }
+
+
+SCHEMAS = {
+    "racas": _entity_schema("Raça", {
+        "description": _STRING,
+        "attributes": {
+            "type": "object",
+            "additionalProperties": {"type": "integer"}
+        },
+        "size": _STRING,
+        "creature_type": _STRING,
+        "speed": _NUMBER,
+        "abilities": {**_ABILITIES, "type": "array"},
+    }, required=("attributes", "abilities")),
+
+    "classes": _entity_schema("Classe", {
+        "description": _STRING,
+        "hit_points": {
+            "type": "object",
+            "properties": {
+                "initial": {"type": "integer"},
+                "per_level": {"type": "integer"},
+                "attribute": _ATTRIBUTE,
+            }
+        },
+        "mana_points_per_level": _INTEGER,
+        "skills": {
+            "type": "object",
+            "properties": {
+                "mandatory": _SLUGS,
+                "choose": {
+                    "type": ["object", "null"],
+                    "properties": {
+                        "amount": {"type": "integer"},
+                        "from": _SLUGS,
+                    }
+                }
+            }
+        },
+        "proficiencies": _SLUGS,
+        "famous_characters": _SLUGS,
+        "class_features": _ABILITIES,
+        "powers": _SLUGS,
+    }, required=("hit_points", "skills")),
+
+    "origens": _entity_schema("Origem", {
+        "description": _STRING,
+        "items": {"type": ["array", "null"], "items": {"type": "object"}},
+        "benefits": {
+            "type": "object",
+            "properties": {
+                "skills": _SLUGS,
+                "powers": _SLUGS,
+                "special_choices": {"type": ["array", "null"], "items": {"type": "object"}},
+                "choose": _INTEGER,
+            }
+        },
+        "unique_power": _OBJECT,
+    }, required=("benefits",)),
+
+    "divindades": _entity_schema("Divindade", {
+        "title": _STRING,
+        "description": _STRING,
+        "beliefs_and_goals": _SLUGS,
+        "holy_symbol": _STRING,
+        "channel_energy": {"type": "string", "enum": ["positiva", "negativa", "qualquer"]},
+        "preferred_weapon": _STRING,
+        "devotees": {
+            "type": ["object", "null"],
+            "properties": {"races": _SLUGS, "classes": _SLUGS}
+        },
+        "granted_powers": {"type": "array", "items": {"type": "string"}},
+        "obligations_and_restrictions": {"type": ["array", "null"], "items": {"type": "object"}},
+    }, required=("channel_energy", "granted_powers")),
+
+    "pericias": _entity_schema("Perícia", {
+        "key_attribute": {"type": "string", "enum": ["for", "des", "con", "int", "sab", "car"]},
+        "armor_penalty": _BOOLEAN,
+        "trained_only": _BOOLEAN,
+        "description": _STRING,
+        "uses": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "string"},
+                    "name": {"type": "string"},
+                    "cd": {"type": ["integer", "string", "null"]},
+                    "trained_only": _BOOLEAN,
+                    "action": _STRING,
+                    "description": _STRING,
+                    "cd_table": {"type": ["array", "null"], "items": {"type": "object"}},
+                    "effects": _EFFECTS,
+                }
+            }
+        },
+    }, required=("key_attribute", "uses")),
+
+    "magias": _entity_schema("Magia", {
+        "type": {"type": "string", "enum": ["arcana", "divina", "universal"]},
+        "circle": {"type": ["integer", "string"]},
+        "school": _STRING,
+        "execution": _STRING,
+        "execution_details": _STRING,
+        "range": _STRING,
+        "target": _OBJECT,
+        "effect": _STRING,
+        "effect_details": _OBJECT,
+        "duration": _STRING,
+        "duration_details": _STRING,
+        "resistance": _OBJECT,
+        "extra_costs": {"type": ["array", "object", "string", "null"]},
+        "description": _STRING,
+        "enhancements": {"type": ["array", "null"], "items": {"type": "object"}},
+        "effects": _EFFECTS,
+    }, required=("type", "circle")),
+
+    "poderes": _entity_schema("Poder", {
+        "type": _STRING,
+        "sub_type": _STRING,
+        "description": _STRING,
+        "requirements": {"type": ["array", "null"], "items": {"type": "object"}},
+        "effects": _EFFECTS,
+        "costs": {"type": ["array", "null"], "items": {"type": "object"}},
+    }),
+
+    "armas": _entity_schema("Arma", {
+        "category": _STRING,
+        "type": _STRING,
+        "price": _NUMBER,
+        "damage": _STRING,
+        "damage_type": _STRING,
+        "critical": _STRING,
+        "range": {"type": ["number", "string", "null"]},
+        "weight": {"type": ["number", "string", "null"]},
+        "properties": _SLUGS,
+        "description": _STRING,
+    }),
+
+    "armaduras": _entity_schema("Armadura", {
+        "type": _STRING,
+        "price": _NUMBER,
+        "defense_bonus": _INTEGER,
+        "armor_penalty": _INTEGER,
+        "weight": {"type": ["number", "string", "null"]},
+        "description": _STRING,
+    }),
+
+    "itens_gerais": _entity_schema("Item geral", {
+        "category": _STRING,
+        "price": _NUMBER,
+        "weight": {"type": ["number", "string", "null"]},
+        "description": _STRING,
+    }),
+
+    "itens_superiores": _entity_schema("Item superior", {
+        "base_item": _STRING,
+        "type": _STRING,
+        "price_modifier": {"type": ["number", "string", "null"]},
+        "effects": _EFFECTS,
+        "description": _STRING,
+    }),
+
+    "criaturas": _entity_schema("Criatura", {
+        "nd": {"type": ["number", "string", "null"]},
+        "type": _STRING,
+        "size": _STRING,
+        "attributes": {"type": ["object", "null"], "additionalProperties": {"type": ["integer", "null"]}},
+        "defense": _INTEGER,
+        "hit_points": _INTEGER,
+        "speed": _NUMBER,
+        "special_movement": _SLUGS,
+        "resistances": _SLUGS,
+        "immunities": _SLUGS,
+        "vulnerabilities": _SLUGS,
+        "senses": _SLUGS,
+        "attacks": {"type": ["array", "null"], "items": {"type": "object"}},
+        "abilities": _ABILITIES,
+        "treasure": _STRING,
+        "description": _STRING,
+    }),
+
+    "perigos": _entity_schema("Perigo", {
+        "type": _STRING,
+        "nd": {"type": ["number", "string", "null"]},
+        "detection": _OBJECT,
+        "disarm": _OBJECT,
+        "trigger": _STRING,
+        "effect": _STRING,
+        "damage": _STRING,
+        "damage_type": _STRING,
+        "save": _OBJECT,
+        "description": _STRING,
+    }),
+
+    "tesouros": _entity_schema("Tesouro", {
+        "category": _STRING,
+        "value": _NUMBER,
+        "value_range": _OBJECT,
+        "description": _STRING,
+    }),
+
+    "itens_magicos_armas": _entity_schema("Arma mágica", {
+        "type": _STRING,
+        "rarity": _STRING,
+        "aura": _STRING,
+        "price": _NUMBER,
+        "base_item": _STRING,
+        "enhancement_bonus": _INTEGER,
+        "abilities": _ABILITIES,
+        "description": _STRING,
+    }),
+
+    "itens_magicos_armaduras": _entity_schema("Armadura mágica", {
+        "type": _STRING,
+        "rarity": _STRING,
+        "aura": _STRING,
+        "price": _NUMBER,
+        "base_item": _STRING,
+        "enhancement_bonus": _INTEGER,
+        "abilities": _ABILITIES,
+        "description": _STRING,
+    }),
+
+    "pocoes_pergaminhos": _entity_schema("Poção ou pergaminho", {
+        "type": _STRING,
+        "spell": _STRING,
+        "spell_circle": _INTEGER,
+        "price": _NUMBER,
+        "description": _STRING,
+    }),
+
+    "acessorios": _entity_schema("Acessório mágico", {
+        "slot": _STRING,
+        "rarity": _STRING,
+        "aura": _STRING,
+        "price": _NUMBER,
+        "abilities": _ABILITIES,
+        "description": _STRING,
+    }),
+
+    "artefatos": _entity_schema("Artefato", {
+        "type": _STRING,
+        "slot": _STRING,
+        "aura": _STRING,
+        "abilities": _ABILITIES,
+        "drawbacks": {"type": ["array", "null"], "items": {"type": "object"}},
+        "destruction": _STRING,
+        "history": _STRING,
+        "description": _STRING,
+    }),
+
+    "condicoes": _entity_schema("Condição", {
+        "description": _STRING,
+        "effects": _EFFECTS,
+        "duration": _STRING,
+        "removal": _STRING,
+    }),
+}
+
+# Schemas das partes de entidades divididas: mesmos tipos, só id e name obrigatórios
+PARTIAL_SCHEMAS = {
+    name: {**schema, "required": ["id", "name"]} for name, schema in SCHEMAS.items()
+}
+
+
 # Mapeamento de tipos para prompts (para tipos que compartilham estrutura)
 PROMPT_FALLBACKS = {
     "poderes_combate": "poderes",
@@ -767,12 +1082,16 @@ PROMPT_FALLBACKS = {
 }
 
 
-def get_prompt(entity_type: str, content: str) -> tuple[str, str]:
+def split_prompt(entity_type: str, content: str) -> tuple[str, str, str]:
     """
-    Retorna o prompt formatado para uma entidade.
+    Retorna o prompt de uma entidade separado em partes.
+
+    O prefixo (instrução e exemplo) é o mesmo para todas as entidades do
+    tipo, então o servidor pode reaproveitar a avaliação dele entre
+    requisições; só o conteúdo muda.
 
     Returns:
-        Tupla com (system_prompt, user_prompt)
+        Tupla com (system_prompt, prefixo, conteúdo)
     """
     # Usa fallback se o tipo não tiver prompt específico
     prompt_type = PROMPT_FALLBACKS.get(entity_type, entity_type)
@@ -781,9 +1100,92 @@ def get_prompt(entity_type: str, content: str) -> tuple[str, str]:
         raise ValueError(f"Tipo de entidade desconhecido: {entity_type}. Tipos disponíveis: {list(PROMPTS.keys())}")
 
     prompt_config = PROMPTS[prompt_type]
-    user_prompt = prompt_config["instruction"] + content
+    prefix = prompt_config["instruction"]
 
     if prompt_config.get("example"):
-        user_prompt += f"\n\nEXEMPLO DE OUTPUT:\n{prompt_config['example']}"
+        # O exemplo vai antes do rótulo final ("TEXTO DA ...:"), que precede o conteúdo
+        body, label = prefix.rstrip("\n").rsplit("\n", 1)
+        prefix = f"{body}\n\nEXEMPLO DE OUTPUT:\n{prompt_config['example']}\n\n{label}\n"
+
+    return SYSTEM_PROMPT, prefix, content
+
+
+def get_prompt(entity_type: str, content: str) -> tuple[str, str]:
+    """
+    Retorna o prompt formatado para uma entidade.
+
+    Returns:
+        Tupla com (system_prompt, user_prompt)
+    """
+    system_prompt, prefix, content = split_prompt(entity_type, content)
+    return system_prompt, prefix + content
+
 
+BATCH_INSTRUCTION = """Os textos abaixo contêm {count} entidades, separadas por marcadores "=== ENTIDADE N ===".
+Retorne um ARRAY JSON com exatamente {count} objetos, um por entidade e na mesma ordem.
+Cada objeto segue as instruções e a estrutura abaixo.
+
+"""
+
+
+def get_batch_prompt(entity_type: str, contents: list[str]) -> tuple[str, str]:
+    """
+    Retorna o prompt que pede várias entidades em uma única resposta (array JSON).
+
+    Returns:
+        Tupla com (system_prompt, user_prompt)
+    """
+    system_prompt, prefix, _ = split_prompt(entity_type, "")
+
+    user_prompt = BATCH_INSTRUCTION.format(count=len(contents)) + prefix
+    for number, content in enumerate(contents, 1):
+        user_prompt += f"\n=== ENTIDADE {number} ===\n{content}\n"
+
+    return system_prompt, user_prompt
+
+
+REPAIR_INSTRUCTION = """O JSON abaixo, extraído de uma entidade do tipo "{entity_type}", não passou na validação.
+
+Erros:
+{errors}
+
+Corrija apenas o necessário para resolver os erros, mantendo os demais campos como estão,
+e retorne o JSON completo corrigido.
+
+JSON:
+{json_text}"""
+
+
+def get_repair_prompt(entity_type: str, json_text: str, errors: list[str]) -> tuple[str, str]:
+    """
+    Retorna o prompt que pede a correção de um JSON que falhou na validação.
+
+    Leva só o JSON e os erros, sem o texto original da entidade.
+
+    Returns:
+        Tupla com (system_prompt, user_prompt)
+    """
+    user_prompt = REPAIR_INSTRUCTION.format(
+        entity_type=entity_type,
+        errors="\n".join(f"- {error}" for error in errors),
+        json_text=json_text
+    )
     return SYSTEM_PROMPT, user_prompt
+
+
+def get_schema(entity_type: str, partial: bool = False) -> dict:
+    """
+    Retorna o JSON Schema de um tipo de entidade.
+
+    Tipos sem schema próprio usam o do tipo de fallback (ver PROMPT_FALLBACKS).
+    Com `partial=True`, só id e name são obrigatórios: é o schema das partes
+    de uma entidade dividida, em que cada parte traz só alguns campos.
+    """
+    schema_type = PROMPT_FALLBACKS.get(entity_type, entity_type)
+
+    if schema_type not in SCHEMAS:
+        raise ValueError(f"Tipo de entidade desconhecido: {entity_type}. Tipos disponíveis: {list(SCHEMAS.keys())}")
+
+    if partial:
+        return PARTIAL_SCHEMAS[schema_type]
+    return SCHEMAS[schema_type]
@@ -0,0 +1,171 @@
+"""
+Testes do LLMClientPool contra servidores Ollama de mentira.
+
+Cada servidor é um `http.server` em uma porta livre, que responde a
+/api/tags e /api/generate com um atraso configurável e pode passar a
+falhar (erro 500) a qualquer momento.
+
+Uso:
+    python -m unittest discover tools/pdf_extractor/tests
+"""
+
+import json
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline import EJECT_AFTER, EJECT_SECONDS, LLMClientPool  # noqa: E402
+
+
+class StandInServer:
+    """Servidor Ollama de mentira em uma porta livre."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.failing = False
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code: int, body: dict) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if server.failing:
+                    self._send(500, {"error": "indisponível"})
+                else:
+                    self._send(200, {"models": [{"name": "mistral:latest"}]})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server.requests += 1
+                if server.failing:
+                    self._send(500, {"error": "indisponível"})
+                    return
+                time.sleep(server.delay)
+                self._send(200, {"response": '{"id": "x", "name": "X"}', "done": True, "eval_count": 8})
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class LLMClientPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.close()
+
+    def make_pool(self, *delays: float) -> LLMClientPool:
+        self.servers = [StandInServer(delay) for delay in delays]
+        pool = LLMClientPool([server.url for server in self.servers])
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_routes_to_the_least_loaded_server(self):
+        pool = self.make_pool(0.2, 0.0)
+        for _ in range(10):
+            self.assertEqual(pool.generate("sistema", "texto"), '{"id": "x", "name": "X"}')
+
+        slow, fast = self.servers
+        # Depois de medir os dois, o lento só recebe a primeira requisição
+        self.assertEqual(slow.requests, 1)
+        self.assertEqual(fast.requests, 9)
+
+    def test_spreads_concurrent_requests(self):
+        pool = self.make_pool(0.1, 0.1)
+        threads = [threading.Thread(target=pool.generate, args=("sistema", "texto")) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sum(server.requests for server in self.servers), 8)
+        self.assertTrue(all(server.requests >= 2 for server in self.servers))
+
+    def test_ejects_a_failing_server_and_retries_elsewhere(self):
+        pool = self.make_pool(0.0, 0.0)
+        failing, healthy = self.servers
+        failing.failing = True
+
+        for _ in range(EJECT_AFTER * 2):
+            self.assertEqual(pool.generate("sistema", "texto"), '{"id": "x", "name": "X"}')
+
+        backend = pool.backends[0]
+        self.assertEqual(backend.ejections, 1)
+        self.assertTrue(backend.probation)
+        self.assertGreater(backend.ejected_until, time.monotonic())
+        self.assertEqual(backend.cooldown, EJECT_SECONDS * 2)
+        # Afastado, o servidor não recebe mais requisições
+        requests_while_ejected = failing.requests
+        pool.generate("sistema", "texto")
+        self.assertEqual(failing.requests, requests_while_ejected)
+        self.assertGreater(healthy.requests, 0)
+
+    def test_readmits_a_recovered_server_after_probation(self):
+        pool = self.make_pool(0.0, 0.0)
+        failing = self.servers[0]
+        failing.failing = True
+        for _ in range(EJECT_AFTER):
+            pool.generate("sistema", "texto")
+
+        backend = pool.backends[0]
+        self.assertEqual(backend.ejections, 1)
+
+        # Passado o prazo, volta em observação; um sucesso o readmite
+        failing.failing = False
+        backend.ejected_until = 0.0
+        backend.latency = 0.0
+        pool.generate("sistema", "texto")
+        self.assertFalse(backend.probation)
+        self.assertEqual(backend.cooldown, EJECT_SECONDS)
+        self.assertEqual(backend.ejections, 1)
+
+    def test_failure_in_probation_ejects_again(self):
+        pool = self.make_pool(0.0, 0.0)
+        failing = self.servers[0]
+        failing.failing = True
+        for _ in range(EJECT_AFTER):
+            pool.generate("sistema", "texto")
+
+        backend = pool.backends[0]
+        backend.ejected_until = 0.0
+        backend.latency = 0.0
+        pool.generate("sistema", "texto")
+        self.assertEqual(backend.ejections, 2)
+        self.assertEqual(backend.cooldown, EJECT_SECONDS * 4)
+
+    def test_check_connection_ejects_unreachable_servers(self):
+        pool = self.make_pool(0.0, 0.0)
+        self.servers[1].close()
+        self.servers = self.servers[:1]
+
+        self.assertTrue(pool.check_connection())
+        self.assertEqual(pool.backends[1].ejections, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()